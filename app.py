@@ -1,26 +1,38 @@
+import time
+
+_STARTUP_BEGAN = time.perf_counter()
+
 import json
 import os
 import logging
-from transformers import AutoModelForCausalLM, AutoTokenizer, Trainer, TrainingArguments
-from datasets import Dataset
-import torch
+import importlib
+import subprocess
 import requests
 import re
-import streamlit as st
-from datetime import datetime
 import uuid
-from duckduckgo_search import DDGS
 from dotenv import load_dotenv
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
 import io
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
-from googleapiclient.http import MediaIoBaseDownload
-import time
 import tempfile
+import threading
+import hashlib
+import sys
+import types
+import queue
+import argparse
+import csv
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import math
+import functools
+import copy
+import textwrap
+import html
+import unicodedata
+import heapq
+import random
+import contextlib
+from email.utils import parsedate_to_datetime
+from collections import Counter, OrderedDict, deque
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -29,6 +41,64 @@ logger = logging.getLogger(__name__)
 # Load environment variables from .env file
 load_dotenv()
 
+# Lazily loaded heavy dependencies: only sessions that actually use the local
+# model, fine-tuning or Google export pay for importing them.
+IMPORT_TIMES = {}
+
+
+class LazyModule(types.ModuleType):
+    """Module proxy that imports the real module on first attribute access."""
+
+    def __init__(self, name):
+        super().__init__(name)
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            started = time.perf_counter()
+            module = importlib.import_module(self.__name__)
+            IMPORT_TIMES[self.__name__] = time.perf_counter() - started
+            logger.debug(
+                f"Lazy import of {self.__name__} took {IMPORT_TIMES[self.__name__]:.3f}s"
+            )
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+
+def lazy_import(name):
+    return LazyModule(name)
+
+
+st = lazy_import("streamlit")
+torch = lazy_import("torch")
+transformers = lazy_import("transformers")
+datasets = lazy_import("datasets")
+google_discovery = lazy_import("googleapiclient.discovery")
+google_http = lazy_import("googleapiclient.http")
+fpdf = lazy_import("fpdf")
+
+# Streamlit re-executes this script on every rerun, so module globals do not
+# survive. Process-wide state lives on a module object in sys.modules instead.
+_PROCESS_STATE = sys.modules.setdefault(
+    "resume_builder_process_state", types.ModuleType("resume_builder_process_state")
+)
+_PROCESS_STATE_LOCK = _PROCESS_STATE.__dict__.setdefault("_lock", threading.RLock())
+
+
+def process_singleton(name, factory):
+    """Returns the process-wide object stored under name, creating it once."""
+    with _PROCESS_STATE_LOCK:
+        if not hasattr(_PROCESS_STATE, name):
+            setattr(_PROCESS_STATE, name, factory())
+        return getattr(_PROCESS_STATE, name)
+
 # Configuration
 MODEL_CONFIG = {
     "openai": {
@@ -62,10 +132,198 @@ MODEL_CONFIG = {
         "base_url": None,
         "chat_endpoint": None,
         "api_key": None,
+        # "baseline": fp32 pipeline as loaded; "optimized": int8 dynamic
+        # quantization of Linear layers (torchao when torch lacks it) plus
+        # explicit CPU thread settings. Opt-in, since quantization changes the
+        # output
+        "inference_mode": os.getenv("LOCAL_INFERENCE_MODE", "baseline"),
+        "num_threads": int(os.getenv("LOCAL_NUM_THREADS", "0")) or None,
+        "interop_threads": 1,
+        "compile": os.getenv("LOCAL_TORCH_COMPILE", "0") == "1",
+        # KV caches kept for the constant portfolio prefix of the prompts
+        "prefix_cache_size": 4,
     },
 }
 DATA_FILE = "personal_data.json"
 
+# Cold-start budget for importing this module (Streamlit worker and CLI entry points)
+STARTUP_BUDGET_MS = int(os.getenv("STARTUP_BUDGET_MS", "1500"))
+
+# On-disk cache of LLM responses keyed by provider, model, prompt and sampling settings
+RESPONSE_CACHE_CONFIG = {
+    "directory": os.path.join(".cache", "responses"),
+    "max_mb": 200,
+    "ttl_seconds": 7 * 24 * 60 * 60,
+}
+
+# Pooled keep-alive HTTP sessions for API-based providers
+HTTP_CONFIG = {
+    "pool_size": int(os.getenv("HTTP_POOL_SIZE", "10")),
+    "connect_timeout": 5,
+    "read_timeout": 120,
+}
+
+# Race mode: send one prompt to several providers and keep the first usable answer
+RACE_CONFIG = {
+    # Hedged races start the primary alone and add the others after this
+    # percentile of the primary's recent latency
+    "hedge_percentile": 0.95,
+    "min_samples_for_hedge": 5,
+    "default_hedge_delay_seconds": 5.0,
+    "latency_history": 50,
+    "log_size": 20,
+}
+
+# Health-scored routing: per-model rolling latency and error rates decide the
+# order models are tried in, and a circuit breaker skips failing models
+ROUTER_CONFIG = {
+    # Also route to the models of other enabled providers, not only
+    # fallback_models (opt-in: a request may then be answered by another vendor)
+    "cross_provider": os.getenv("ROUTER_CROSS_PROVIDER", "0") == "1",
+    # Another provider's model must be this many times faster to go first
+    "cross_provider_penalty": 1.5,
+    "window": 20,
+    "min_samples": 4,
+    # The circuit opens above this error rate (429s count as errors) or after
+    # this many failures in a row
+    "max_error_rate": 0.5,
+    "max_consecutive_failures": 3,
+    # An open circuit lets one probe request through after this long
+    "open_seconds": 30,
+    # Assumed latency of models without successful calls yet
+    "default_latency_seconds": 10.0,
+}
+
+# Client-side rate limiting and retries for API providers. Set the limits to
+# your account tier; providers without an entry are not throttled.
+RATE_LIMIT_CONFIG = {
+    "limits": {
+        "openai": {"rpm": 500, "tpm": 30000},
+        "grok": {"rpm": 480, "tpm": 100000},
+        "gemini": {"rpm": 360, "tpm": 120000},
+    },
+    # Retries of the same model on 429, 5xx and connection errors
+    "max_retries": 3,
+    "backoff_base_seconds": 1.0,
+    "backoff_max_seconds": 30.0,
+}
+
+# Near-duplicate job descriptions: MinHash signatures with LSH banding, so a
+# reposted role can reuse (or partially refresh) the resume made for it before
+SIMILAR_JOBS_CONFIG = {
+    "path": os.path.join(".cache", "similar_jobs.jsonl"),
+    # Estimated Jaccard similarity of word shingles needed to offer a reuse
+    "threshold": 0.8,
+    "shingle_size": 3,
+    "num_perm": 128,
+    # 32 bands of 4 rows make postings above ~0.45 similarity candidates
+    "bands": 32,
+    "max_entries": 5000,
+}
+
+# Relevance-ranked portfolio retrieval: only the parts of personal_data that
+# match the job description go into the prompt
+RETRIEVAL_CONFIG = {
+    "enabled": True,
+    # Approximate token budget for the portfolio part of the prompt
+    "token_budget": int(os.getenv("PORTFOLIO_TOKEN_BUDGET", "1800")),
+    # Items always kept (best-scoring first), whatever the budget
+    "min_bullets_per_experience": 2,
+    "min_projects": 3,
+    "min_skills": 10,
+    "min_achievements": 1,
+    # Local models with prefix caching: context tokens the cached portfolio
+    # core leaves free for the job description and the items picked for it
+    "prefix_reserve_tokens": 400,
+    # BM25 parameters
+    "k1": 1.5,
+    "b": 0.75,
+}
+
+# Append-only ledger of every LLM call: tokens, latency and estimated cost
+LEDGER_CONFIG = {
+    "path": os.getenv("LLM_LEDGER_FILE", "llm_ledger.jsonl"),
+    # USD per 1M (prompt, completion) tokens
+    "pricing": {
+        "gpt-4o": (2.50, 10.00),
+        "grok-3": (3.00, 15.00),
+        "grok-3-fast": (5.00, 25.00),
+        "grok-3-mini": (0.30, 0.50),
+        "models/gemini-1.5-pro": (1.25, 5.00),
+    },
+}
+
+# Fine-tuning the local model on prepare_dataset() texts
+FINETUNE_CONFIG = {
+    "output_dir": "finetuned-local",
+    # Tokenized, packed datasets are stored here as memory-mapped Arrow files
+    "cache_dir": os.path.join(".cache", "datasets"),
+    "block_size": 512,
+    "epochs": 3,
+    "batch_size": 4,
+    "learning_rate": 2e-4,
+    # LoRA adapters (requires the optional `peft` package)
+    "lora_rank": 8,
+    "lora_alpha": 16,
+    "lora_dropout": 0.05,
+    "lora_target_modules": ["q_proj", "k_proj", "v_proj", "o_proj"],
+}
+
+# Model registry: shared LLMModel instances across Streamlit sessions and reruns
+REGISTRY_CONFIG = {
+    # Providers loaded in a background thread when the process starts
+    "warm_up": [p for p in os.getenv("WARM_UP_MODELS", "openai").split(",") if p],
+    # Unreferenced models idle for longer than this are dropped
+    "idle_ttl_seconds": 30 * 60,
+    # Upper bound on the estimated weight memory of loaded models
+    "max_memory_mb": int(os.getenv("MODEL_REGISTRY_MAX_MB", "4096")),
+}
+
+# Pre-made duplicates of the Google Doc resume template, so a PDF export
+# starts at the placeholder replacement instead of waiting for a Drive copy
+TEMPLATE_POOL_CONFIG = {
+    "enabled": True,
+    # Ready copies kept per template
+    "size": int(os.getenv("TEMPLATE_POOL_SIZE", "2")),
+    # Ready copies older than this are discarded, so template edits show up
+    "max_age_seconds": 60 * 60,
+    # Every copy is named with this prefix; the sweeper deletes leftovers
+    "name_prefix": "Resume Export",
+    "orphan_age_seconds": 2 * 60 * 60,
+    "sweep_interval_seconds": 30 * 60,
+}
+
+# Resume PDF export backends: "google" copies and exports the Google Doc
+# template, "local" renders an HTML template in-process with fpdf2
+PDF_EXPORT_CONFIG = {
+    "backend": os.getenv("PDF_BACKEND", "google"),
+    "local_template": os.path.join("templates", "resume.html"),
+    # Font families typed in the UI, mapped to the fpdf2 core fonts
+    "core_fonts": {
+        "arial": "helvetica",
+        "helvetica": "helvetica",
+        "calibri": "helvetica",
+        "times new roman": "times",
+        "times": "times",
+        "georgia": "times",
+        "courier new": "courier",
+        "courier": "courier",
+    },
+    # Optional TrueType files by family name, for other fonts and full
+    # Unicode, e.g. {"Roboto": "fonts/Roboto-Regular.ttf"}. Core fonts are
+    # Latin-1 only, so other characters are transliterated.
+    "ttf_fonts": {},
+}
+
+# Exported PDFs keyed on the placeholders, template revision, styling and backend
+PDF_CACHE_CONFIG = {
+    "directory": os.path.join(".cache", "pdfs"),
+    "max_mb": 100,
+    "ttl_seconds": 30 * 24 * 60 * 60,
+    # How long a Google Doc template's modifiedTime is trusted before re-checking
+    "revision_ttl_seconds": 60,
+}
+
 # Sample personal data (unchanged)
 personal_data = {
     "profile": {
@@ -451,32 +709,319 @@ personal_data = {
 }
 
 
-def get_google_creds(SCOPES):
+def _load_google_creds(SCOPES):
     """
     Returns a google.oauth2.service_account.Credentials object for the given scopes.
     - If ENVIRONMENT=local, loads from 'service_account.json'.
-    - Else, loads from SERVICE_ACCOUNT_JSON env var (the full JSON as a string).
+    - Else, parses the SERVICE_ACCOUNT_JSON env var (the full JSON as a string)
+      in memory.
     """
     from google.oauth2.service_account import Credentials
-    import tempfile
-    import json
 
     environment = os.getenv("ENVIRONMENT", "local").lower()
     if environment == "local":
         creds_path = "service_account.json"
         if not os.path.exists(creds_path):
             raise RuntimeError(f"Service account file '{creds_path}' not found!")
-        creds = Credentials.from_service_account_file(creds_path, scopes=SCOPES)
-    else:
-        sa_json = os.getenv("SERVICE_ACCOUNT_JSON")
-        if not sa_json:
-            raise RuntimeError("SERVICE_ACCOUNT_JSON environment variable not set!")
-        # Write to a temp file for compatibility
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".json") as tmp:
-            tmp.write(sa_json.encode())
-            tmp.flush()
-            creds = Credentials.from_service_account_file(tmp.name, scopes=SCOPES)
-    return creds
+        return Credentials.from_service_account_file(creds_path, scopes=SCOPES)
+    sa_json = os.getenv("SERVICE_ACCOUNT_JSON")
+    if not sa_json:
+        raise RuntimeError("SERVICE_ACCOUNT_JSON environment variable not set!")
+    return Credentials.from_service_account_info(json.loads(sa_json), scopes=SCOPES)
+
+
+# Process-wide Google credentials and Docs/Drive service objects
+class GoogleClients:
+    def __init__(self, refresh_margin_seconds, check_interval_seconds):
+        self.refresh_margin_seconds = refresh_margin_seconds
+        self.check_interval_seconds = check_interval_seconds
+        self._creds = {}
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        # httplib2 connections are not thread-safe, so services are per thread
+        self._local = threading.local()
+        self._refresher = None
+
+    def credentials(self, scopes):
+        key = tuple(sorted(scopes))
+        with self._lock:
+            creds = self._creds.get(key)
+            if creds is None:
+                creds = self._creds[key] = _load_google_creds(list(key))
+                if self._refresher is None:
+                    self._refresher = threading.Thread(
+                        target=self._refresh_loop, name="google-token-refresh", daemon=True
+                    )
+                    self._refresher.start()
+        return creds
+
+    def service(self, name, version, scopes):
+        services = self._local.__dict__.setdefault("services", {})
+        key = (name, version, tuple(sorted(scopes)))
+        if key not in services:
+            # static_discovery uses the discovery documents bundled with the
+            # client library instead of fetching them over the network
+            services[key] = google_discovery.build(
+                name,
+                version,
+                credentials=self.credentials(scopes),
+                static_discovery=True,
+                cache_discovery=False,
+            )
+        return services[key]
+
+    def _needs_refresh(self, creds):
+        if not creds.valid or creds.expiry is None:
+            return True
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        remaining = (creds.expiry - now).total_seconds()
+        return remaining < self.refresh_margin_seconds
+
+    def refresh_expiring(self):
+        """Refreshes tokens that are missing or close to expiry."""
+        from google.auth.transport.requests import Request
+
+        with self._lock:
+            all_creds = list(self._creds.values())
+        for creds in all_creds:
+            with self._refresh_lock:
+                if self._needs_refresh(creds):
+                    creds.refresh(Request())
+                    logger.debug(f"Refreshed Google access token, expires {creds.expiry}")
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                self.refresh_expiring()
+            except Exception as e:
+                logger.warning(f"Background Google token refresh failed: {str(e)}")
+            time.sleep(self.check_interval_seconds)
+
+
+GOOGLE_CLIENTS = process_singleton(
+    "google_clients",
+    lambda: GoogleClients(refresh_margin_seconds=5 * 60, check_interval_seconds=60),
+)
+
+
+def get_google_creds(SCOPES):
+    """Returns the cached service-account credentials for the given scopes."""
+    return GOOGLE_CLIENTS.credentials(SCOPES)
+
+
+GOOGLE_EXPORT_SCOPES = [
+    "https://www.googleapis.com/auth/documents",
+    "https://www.googleapis.com/auth/drive",
+]
+
+
+def google_export_available():
+    """True when a Drive service can be built from the configured credentials."""
+    try:
+        GOOGLE_CLIENTS.service("drive", "v3", GOOGLE_EXPORT_SCOPES)
+    except Exception as e:
+        logger.info(f"Google export unavailable: {str(e)}")
+        return False
+    return True
+
+
+def _google_error_status(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "resp", None), "status", None)
+    return status
+
+
+class TemplatePool:
+    """Per-template queue of pre-copied Google Docs plus background deletion.
+
+    take() hands out a ready copy (or makes one inline when the queue is
+    empty) and schedules a refill; release() queues the used copy for
+    deletion on a worker thread, off the request path.
+    """
+
+    def __init__(
+        self, drive, size, max_age_seconds, name_prefix, orphan_age_seconds
+    ):
+        # drive() returns a Drive service usable from the calling thread
+        self.drive = drive
+        self.size = size
+        self.max_age_seconds = max_age_seconds
+        self.name_prefix = name_prefix
+        self.orphan_age_seconds = orphan_age_seconds
+        self._ready = {}
+        self._refilling = set()
+        self._lock = threading.Lock()
+        self._refiller = ThreadPoolExecutor(
+            max_workers=2, thread_name_prefix="template-pool"
+        )
+        self._deletions = queue.Queue()
+        self._deleter = threading.Thread(
+            target=self._delete_loop, name="template-pool-delete", daemon=True
+        )
+        self._deleter.start()
+        self._sweeper = None
+        self.stats = Counter()
+
+    def _copy(self, template_id):
+        copied = (
+            self.drive()
+            .files()
+            .copy(
+                fileId=template_id,
+                body={"name": f"{self.name_prefix} {int(time.time())}"},
+            )
+            .execute()
+        )
+        return copied["id"]
+
+    def take(self, template_id):
+        """Returns the id of a fresh copy of template_id."""
+        stale = []
+        doc_id = None
+        with self._lock:
+            ready = self._ready.setdefault(template_id, deque())
+            while ready:
+                candidate, created = ready.popleft()
+                if time.time() - created <= self.max_age_seconds:
+                    doc_id = candidate
+                    break
+                stale.append(candidate)
+        for candidate in stale:
+            self.release(candidate)
+        if doc_id is None:
+            self.stats["misses"] += 1
+            doc_id = self._copy(template_id)
+        else:
+            self.stats["hits"] += 1
+        self.prime(template_id)
+        return doc_id
+
+    def prime(self, template_id):
+        """Starts filling the queue for template_id in the background."""
+        with self._lock:
+            if template_id in self._refilling:
+                return
+            if len(self._ready.get(template_id, ())) >= self.size:
+                return
+            self._refilling.add(template_id)
+        self._refiller.submit(self._refill, template_id)
+
+    def _refill(self, template_id):
+        try:
+            while True:
+                with self._lock:
+                    if len(self._ready.setdefault(template_id, deque())) >= self.size:
+                        return
+                doc_id = self._copy(template_id)
+                with self._lock:
+                    self._ready[template_id].append((doc_id, time.time()))
+                self.stats["copies"] += 1
+        except Exception as e:
+            logger.warning(f"Template pool refill for {template_id} failed: {str(e)}")
+        finally:
+            with self._lock:
+                self._refilling.discard(template_id)
+
+    def release(self, doc_id):
+        """Queues a used (or stale) copy for deletion."""
+        self._deletions.put(doc_id)
+
+    def invalidate(self, template_id):
+        """Drops the ready copies of template_id, e.g. after the template changed."""
+        with self._lock:
+            ready = self._ready.pop(template_id, deque())
+        for doc_id, _ in ready:
+            self.release(doc_id)
+
+    def _delete(self, doc_id):
+        try:
+            self.drive().files().delete(fileId=doc_id).execute()
+            self.stats["deleted"] += 1
+        except Exception as e:
+            if _google_error_status(e) != 404:
+                logger.warning(f"Could not delete template copy {doc_id}: {str(e)}")
+
+    def _delete_loop(self):
+        while True:
+            doc_id = self._deletions.get()
+            try:
+                self._delete(doc_id)
+            finally:
+                self._deletions.task_done()
+
+    def wait_for_deletions(self):
+        self._deletions.join()
+
+    def sweep_orphans(self):
+        """
+        Deletes prefixed copies older than orphan_age_seconds left by crashes.
+        Only files the service account owns are considered, never documents
+        merely shared with it.
+        """
+        cutoff = time.time() - self.orphan_age_seconds
+        with self._lock:
+            pooled = {doc_id for ready in self._ready.values() for doc_id, _ in ready}
+        files = self.drive().files()
+        query = (
+            f"name contains '{self.name_prefix}' and 'me' in owners and trashed = false"
+        )
+        orphans = []
+        page_token = None
+        while True:
+            page = files.list(
+                q=query,
+                fields="nextPageToken, files(id, name, createdTime)",
+                pageSize=100,
+                pageToken=page_token,
+            ).execute()
+            for item in page.get("files", []):
+                created = datetime.fromisoformat(
+                    item["createdTime"].replace("Z", "+00:00")
+                ).timestamp()
+                if created < cutoff and item["id"] not in pooled:
+                    orphans.append(item["id"])
+            page_token = page.get("nextPageToken")
+            if not page_token:
+                break
+        for doc_id in orphans:
+            self.release(doc_id)
+        self.stats["orphans"] += len(orphans)
+        return orphans
+
+    def start_sweeper(self, interval_seconds):
+        with self._lock:
+            if self._sweeper is not None:
+                return
+            self._sweeper = threading.Thread(
+                target=self._sweep_loop,
+                args=(interval_seconds,),
+                name="template-pool-sweep",
+                daemon=True,
+            )
+        self._sweeper.start()
+
+    def _sweep_loop(self, interval_seconds):
+        while True:
+            try:
+                orphans = self.sweep_orphans()
+                if orphans:
+                    logger.info(f"Deleting {len(orphans)} orphaned template copies")
+            except Exception as e:
+                logger.warning(f"Template copy sweep failed: {str(e)}")
+            time.sleep(interval_seconds)
+
+
+TEMPLATE_POOL = process_singleton(
+    "template_pool",
+    lambda: TemplatePool(
+        lambda: GOOGLE_CLIENTS.service("drive", "v3", GOOGLE_EXPORT_SCOPES),
+        size=TEMPLATE_POOL_CONFIG["size"],
+        max_age_seconds=TEMPLATE_POOL_CONFIG["max_age_seconds"],
+        name_prefix=TEMPLATE_POOL_CONFIG["name_prefix"],
+        orphan_age_seconds=TEMPLATE_POOL_CONFIG["orphan_age_seconds"],
+    ),
+)
 
 
 # Save personal data to JSON
@@ -510,13 +1055,145 @@ def prepare_dataset():
             for ach in content:
                 texts.append(f"Achievement: {ach}")
 
-    dataset = Dataset.from_dict({"text": texts})
+    dataset = datasets.Dataset.from_dict({"text": texts})
     return dataset
 
 
+# Tokenize and pack prepare_dataset() into fixed-length blocks, cached by data hash
+def tokenized_dataset(tokenizer, block_size):
+    with open(DATA_FILE, "rb") as f:
+        data_hash = hashlib.sha256(f.read()).hexdigest()
+    cache_key = DiskCache.key(data_hash, tokenizer.name_or_path, len(tokenizer), block_size)
+    cache_path = os.path.join(FINETUNE_CONFIG["cache_dir"], cache_key)
+    if os.path.exists(cache_path):
+        logger.info(f"Using cached tokenized dataset {cache_path}")
+        return datasets.load_from_disk(cache_path)
+
+    def tokenize(batch):
+        return tokenizer(
+            [text + tokenizer.eos_token for text in batch["text"]],
+            add_special_tokens=True,
+        )
+
+    def pack(batch):
+        # Concatenate every sample and cut into block_size chunks, so no
+        # compute is spent on padding; a tail shorter than one block is
+        # dropped unless it is all there is
+        ids = [token for sample in batch["input_ids"] for token in sample]
+        size = block_size if len(ids) >= block_size else len(ids)
+        blocks = [ids[i : i + size] for i in range(0, len(ids) - size + 1, size)]
+        return {
+            "input_ids": blocks,
+            "attention_mask": [[1] * len(block) for block in blocks],
+            "labels": [list(block) for block in blocks],
+        }
+
+    dataset = prepare_dataset()
+    tokenized = dataset.map(tokenize, batched=True, remove_columns=["text"])
+    packed = tokenized.map(
+        pack,
+        batched=True,
+        batch_size=len(tokenized),
+        remove_columns=tokenized.column_names,
+    )
+    packed.save_to_disk(cache_path)
+    logger.info(
+        f"Packed {len(dataset)} samples into {len(packed)} blocks of {block_size} tokens"
+    )
+    # Reload so training reads the memory-mapped Arrow files
+    return datasets.load_from_disk(cache_path)
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (2**20 if sys.platform == "darwin" else 2**10), 1)
+
+
+def finetune_local_model(
+    output_dir=None, epochs=None, block_size=None, use_lora=True, merge=False
+):
+    """
+    Fine-tunes MODEL_CONFIG["local"] on the portfolio texts.
+    - use_lora trains low-rank adapters only (needs `peft`), which keeps CPU
+      runs short; otherwise all weights are trained.
+    - merge folds the adapters into the base weights so output_dir can be
+      used directly as the local model_name.
+    Returns the training metrics plus samples/sec and peak RSS.
+    """
+    output_dir = output_dir or FINETUNE_CONFIG["output_dir"]
+    epochs = epochs or FINETUNE_CONFIG["epochs"]
+    block_size = block_size or FINETUNE_CONFIG["block_size"]
+    if not os.path.exists(DATA_FILE):
+        save_personal_data()
+
+    model_name = MODEL_CONFIG["local"]["model_name"]
+    tokenizer = transformers.AutoTokenizer.from_pretrained(model_name)
+    train_dataset = tokenized_dataset(tokenizer, block_size)
+    model = transformers.AutoModelForCausalLM.from_pretrained(model_name)
+
+    if use_lora:
+        try:
+            import peft
+        except ImportError as e:
+            raise Exception(
+                "LoRA fine-tuning needs the 'peft' package (pip install peft), "
+                "or run without LoRA to train all weights."
+            ) from e
+        model = peft.get_peft_model(
+            model,
+            peft.LoraConfig(
+                task_type="CAUSAL_LM",
+                r=FINETUNE_CONFIG["lora_rank"],
+                lora_alpha=FINETUNE_CONFIG["lora_alpha"],
+                lora_dropout=FINETUNE_CONFIG["lora_dropout"],
+                target_modules=FINETUNE_CONFIG["lora_target_modules"],
+            ),
+        )
+    trainable = sum(p.numel() for p in model.parameters() if p.requires_grad)
+    total = sum(p.numel() for p in model.parameters())
+    logger.info(f"Training {trainable:,} of {total:,} parameters")
+
+    trainer = transformers.Trainer(
+        model=model,
+        args=transformers.TrainingArguments(
+            output_dir=output_dir,
+            num_train_epochs=epochs,
+            per_device_train_batch_size=FINETUNE_CONFIG["batch_size"],
+            learning_rate=FINETUNE_CONFIG["learning_rate"],
+            logging_steps=10,
+            save_strategy="no",
+            report_to=[],
+            use_cpu=not torch.cuda.is_available(),
+        ),
+        train_dataset=train_dataset,
+        data_collator=transformers.default_data_collator,
+    )
+    metrics = dict(trainer.train().metrics)
+
+    if use_lora and merge:
+        model = model.merge_and_unload()
+    model.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+
+    metrics.update(
+        blocks=len(train_dataset),
+        block_size=len(train_dataset[0]["input_ids"]),
+        trainable_parameters=trainable,
+        samples_per_second=metrics.get("train_samples_per_second"),
+        peak_rss_mb=_peak_rss_mb(),
+    )
+    return metrics
+
+
 # Generic model class for API-based LLMs
 class LLMModel:
-    def __init__(self, model_config):
+    def __init__(self, model_config, provider=None):
+        self.provider = provider
         self.model_name = model_config["model_name"]
         self.api_key = model_config["api_key"]
         self.base_url = model_config["base_url"]
@@ -524,128 +1201,1487 @@ class LLMModel:
         self.fallback_models = model_config.get("fallback_models", [])
         self.enabled = model_config["enabled"]
         self.is_local = model_config.get("base_url") is None
+        self.temperature = model_config.get("temperature", 0.7)
+        self.max_tokens = model_config.get(
+            "max_tokens", 512 if self.is_local else 1500
+        )
 
-        if self.is_local:
-            from transformers import AutoModelForCausalLM, AutoTokenizer, pipeline
-            self.tokenizer = AutoTokenizer.from_pretrained(model_config["model_name"])
-            self.model = AutoModelForCausalLM.from_pretrained(model_config["model_name"])
-            self.pipe = pipeline("text-generation", model=self.model, tokenizer=self.tokenizer)
+        self.inference_mode = model_config.get("inference_mode", "baseline")
+        # Number of prompt-prefix KV caches kept for the local model (0 disables)
+        self.prefix_cache_size = model_config.get("prefix_cache_size", 0)
+        self.context_window = None
+        self._prefix_caches = OrderedDict()
+        self._prefix_lock = threading.Lock()
 
-    def run_sync(self, prompt):
         if self.is_local:
-            result = self.pipe(prompt, max_new_tokens=512, temperature=0.7)
-            return result[0]["generated_text"]
-        
-        if not self.enabled:
-            raise Exception(f"{self.model_name} is disabled in MODEL_CONFIG")
-        
-        if not self.api_key:
+            self.tokenizer = transformers.AutoTokenizer.from_pretrained(
+                model_config["model_name"]
+            )
+            self.model = transformers.AutoModelForCausalLM.from_pretrained(
+                model_config["model_name"]
+            )
+            self.model.eval()
+            # Prompt plus generated tokens must fit in this many positions
+            self.context_window = getattr(
+                self.model.config, "max_position_embeddings", None
+            )
+            if self.inference_mode == "optimized":
+                self._optimize_for_cpu(model_config)
+
+    def _optimize_for_cpu(self, model_config):
+        configure_torch_threads(
+            model_config.get("num_threads"), model_config.get("interop_threads")
+        )
+        # int8 weights for every Linear layer; activations are quantized on
+        # the fly, which is where CPU decoding spends its time
+        try:
+            self.model = torch.ao.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        except (AttributeError, ImportError):
+            # torch.ao.quantization is deprecated in favor of the separate
+            # torchao package; use that when this torch no longer ships it
+            try:
+                from torchao.quantization import (
+                    Int8DynamicActivationInt8WeightConfig,
+                    quantize_,
+                )
+            except ImportError:
+                logger.warning(
+                    f"Skipping int8 quantization of {self.model_name}: torch "
+                    f"{torch.__version__} has no quantize_dynamic and torchao "
+                    "is not installed"
+                )
+            else:
+                quantize_(self.model, Int8DynamicActivationInt8WeightConfig())
+                logger.info(
+                    f"Local model {self.model_name} quantized to int8 with torchao"
+                )
+        else:
+            logger.info(
+                f"Local model {self.model_name} quantized to int8 for CPU inference"
+            )
+        if model_config.get("compile"):
+            self.model.forward = torch.compile(self.model.forward, dynamic=True)
+
+    def _prefix_cache(self, prefix):
+        """Returns (prefix_ids, past_key_values) for prefix, computing it once."""
+        key = hashlib.sha256(prefix.encode()).hexdigest()
+        with self._prefix_lock:
+            entry = self._prefix_caches.get(key)
+            if entry is not None:
+                self._prefix_caches.move_to_end(key)
+                return entry
+            started = time.perf_counter()
+            prefix_ids = self.tokenizer(prefix, return_tensors="pt").input_ids
+            with torch.inference_mode():
+                past_key_values = self.model(
+                    input_ids=prefix_ids, use_cache=True
+                ).past_key_values
+            entry = self._prefix_caches[key] = (prefix_ids, past_key_values)
+            while len(self._prefix_caches) > self.prefix_cache_size:
+                self._prefix_caches.popitem(last=False)
+            logger.info(
+                f"Prefilled {prefix_ids.shape[1]} prefix tokens in "
+                f"{time.perf_counter() - started:.2f}s"
+            )
+            return entry
+
+    def _local_inputs(self, prompt, prefix=None):
+        """
+        Tokenized generate() arguments for prompt. When the prompt's tokens
+        start with those of a cacheable prefix, they come with a copy of the
+        prefix's precomputed KV cache so only the remainder is prefilled.
+        """
+        inputs = self.tokenizer(prompt, return_tensors="pt")
+        if not (prefix and self.prefix_cache_size and prompt.startswith(prefix)):
+            return dict(inputs)
+        prefix_ids, past_key_values = self._prefix_cache(prefix)
+        input_ids = inputs.input_ids
+        prefix_length = prefix_ids.shape[1]
+        # Tokens can merge across the prefix boundary; the cache only applies
+        # when the prompt tokenizes to exactly the prefix tokens plus more
+        if input_ids.shape[1] <= prefix_length or not torch.equal(
+            input_ids[:, :prefix_length], prefix_ids
+        ):
+            return dict(inputs)
+        return {
+            "input_ids": input_ids,
+            "attention_mask": torch.ones_like(input_ids),
+            # generate() extends the cache in place, so each request gets a copy
+            "past_key_values": copy.deepcopy(past_key_values),
+        }
+
+    def memory_footprint(self):
+        """Estimated bytes held by the model weights (0 for API-based models)."""
+        if not self.is_local:
+            return 0
+        total = sum(p.numel() * p.element_size() for p in self.model.parameters())
+        # Dynamically quantized Linear layers keep packed weights outside parameters()
+        for module in self.model.modules():
+            if callable(getattr(module, "weight", None)):
+                weight = module.weight()
+                total += weight.numel() * weight.element_size()
+        return total
+
+    def _request_parts(self, prompt, provider=None, model=None):
+        if provider is None or provider == (self.provider or self.model_name):
+            config = {
+                "enabled": self.enabled,
+                "api_key": self.api_key,
+                "model_name": self.model_name,
+                "base_url": self.base_url,
+                "chat_endpoint": self.chat_endpoint,
+            }
+        else:
+            config = MODEL_CONFIG[provider]
+        model = model or config["model_name"]
+        if not config["enabled"]:
+            raise Exception(f"{config['model_name']} is disabled in MODEL_CONFIG")
+
+        if not config["api_key"]:
             raise Exception(
-                f"Missing API key for {self.model_name}. Check .env file or environment variables."
+                f"Missing API key for {config['model_name']}. Check .env file or environment variables."
             )
 
         headers = {
-            "Authorization": f"Bearer {self.api_key}",
+            "Authorization": f"Bearer {config['api_key']}",
             "Content-Type": "application/json",
         }
         payload = {
-            "model": self.model_name,
+            "model": model,
             "messages": [{"role": "user", "content": prompt}],
-            "max_tokens": 1500,
-            "temperature": 0.7,
+            "max_tokens": self.max_tokens,
+            "temperature": self.temperature,
         }
-        api_url = f"{self.base_url}{self.chat_endpoint}"
-        logger.debug(f"Attempting API call to {api_url} with model {self.model_name}")
-
-        models_to_try = [self.model_name] + self.fallback_models
-        for model in models_to_try:
-            if self.model_name == 'gemini':
-                api_url = f"{self.base_url}/{model}{self.chat_endpoint}"
-            payload["model"] = model
+        api_url = f"{config['base_url']}{config['chat_endpoint']}"
+        if config["model_name"] == 'gemini':
+            api_url = f"{config['base_url']}/{model}{config['chat_endpoint']}"
+        return headers, payload, api_url
+
+    def _routes(self, cross_provider=None):
+        """
+        Models this request may go to, as (provider, model) pairs in
+        HEALTH_ROUTER order: the model and its fallback_models, plus the
+        models of other configured providers when cross_provider is on.
+        """
+        if cross_provider is None:
+            cross_provider = ROUTER_CONFIG["cross_provider"]
+        provider = self.provider or self.model_name
+        routes = [
+            (provider, model, 1.0) for model in [self.model_name] + self.fallback_models
+        ]
+        if cross_provider:
+            for other, config in MODEL_CONFIG.items():
+                if other == provider or not config["enabled"]:
+                    continue
+                if config.get("base_url") is None or not config.get("api_key"):
+                    continue
+                for model in [config["model_name"]] + config.get("fallback_models", []):
+                    routes.append(
+                        (other, model, ROUTER_CONFIG["cross_provider_penalty"])
+                    )
+        return HEALTH_ROUTER.order(routes)
+
+    def _post(self, provider, model, prompt, stream=False):
+        """
+        POSTs the prompt to one model through RATE_LIMITER, retrying 429, 5xx
+        and connection errors with jittered backoff (honoring Retry-After).
+        Timeouts are not retried: the caller fails over to the next route.
+        Every failed attempt is reported to HEALTH_ROUTER and refunds its
+        token reservation. Returns (response, reserved_tokens, sent_at), where
+        sent_at is when the successful attempt went out; raises the last error.
+        """
+        headers, payload, api_url = self._request_parts(prompt, provider, model)
+        if stream:
+            payload["stream"] = True
+            # Ask for a final chunk carrying token usage
+            payload["stream_options"] = {"include_usage": True}
+        reserved_tokens = estimate_tokens(prompt) + self.max_tokens
+        logger.debug(f"Attempting API call to {api_url} with model {model}")
+        max_retries = RATE_LIMIT_CONFIG["max_retries"]
+        for attempt in range(max_retries + 1):
+            RATE_LIMITER.acquire(provider, reserved_tokens)
+            attempt_started = time.perf_counter()
             try:
-                response = requests.post(api_url, headers=headers, json=payload)
+                response = HTTP_SESSIONS.post(
+                    provider,
+                    api_url,
+                    headers=headers,
+                    json=payload,
+                    stream=stream,
+                )
                 response.raise_for_status()
-                result = response.json()
-                content = (
-                    result.get("choices", [{}])[0].get("message", {}).get("content", "")
+                return response, reserved_tokens, attempt_started
+            except requests.RequestException as e:
+                # Nothing was generated, so the reserved tokens go back
+                RATE_LIMITER.settle(provider, reserved_tokens, 0)
+                error_response = getattr(e, "response", None)
+                status_code = getattr(error_response, "status_code", None)
+                HEALTH_ROUTER.record(
+                    provider,
+                    model,
+                    time.perf_counter() - attempt_started,
+                    ok=False,
+                    status_code=status_code,
                 )
-                logger.debug(f"API response: {json.dumps(result, indent=2)}")
-                return content
-            except requests.HTTPError as e:
-                logger.error(f"HTTP error for {model}: {str(e)}")
-                if e.response.status_code == 404:
+                if status_code == 404:
                     logger.error(
                         f"API endpoint not found for {model}. URL: {api_url}, Response: {e.response.text}"
                     )
-                    if model == models_to_try[-1]:
-                        raise Exception(
-                            f"API endpoint not found for any model. Last tried: {model}, URL: {api_url}, Response: {e.response.text}"
-                        ) from e
-                else:
-                    raise Exception(f"API error for {model}: {str(e)}") from e
+                # A timed-out model would most likely time out again
+                retryable = not isinstance(e, requests.Timeout) and (
+                    status_code is None or status_code in RETRY_STATUSES
+                )
+                if not retryable or attempt == max_retries:
+                    raise
+                retry_after = None
+                if error_response is not None:
+                    retry_after = error_response.headers.get("Retry-After")
+                delay = retry_delay(attempt, retry_after)
+                if status_code == 429:
+                    # Every queued call to this provider waits out the limit
+                    RATE_LIMITER.pause(provider, delay)
+                logger.warning(
+                    f"{provider}/{model} failed ({status_code or str(e)}), "
+                    f"retry {attempt + 1}/{max_retries} in {delay:.1f}s"
+                )
+                time.sleep(delay)
+
+    def run_sync(self, prompt, document_type=None, prefix=None, cross_provider=None):
+        started = time.perf_counter()
+        if self.is_local:
+            inputs = self._local_inputs(prompt, prefix)
+            with torch.inference_mode():
+                output_ids = self.model.generate(
+                    **inputs,
+                    max_new_tokens=self.max_tokens,
+                    temperature=self.temperature,
+                    do_sample=True,
+                )
+            generated = self.tokenizer.decode(
+                output_ids[0, inputs["input_ids"].shape[1] :], skip_special_tokens=True
+            )
+            record_llm_call(
+                self,
+                self.model_name,
+                prompt,
+                generated,
+                None,
+                time.perf_counter() - started,
+                document_type,
+            )
+            return generated
+
+        # Fails early on a disabled provider or a missing key
+        self._request_parts(prompt)
+        errors = []
+        for provider, model in self._routes(cross_provider):
+            sent_at = None
+            try:
+                response, reserved_tokens, sent_at = self._post(provider, model, prompt)
+                result = response.json()
+            except (requests.RequestException, ValueError) as e:
+                # _post reports its own failed attempts; this one answered badly
+                if sent_at is not None:
+                    HEALTH_ROUTER.record(
+                        provider, model, time.perf_counter() - sent_at, ok=False
+                    )
+                logger.error(f"API error for {provider}/{model}: {str(e)}")
+                errors.append(f"{model}: {str(e)}")
+                continue
+            content = (
+                result.get("choices", [{}])[0].get("message", {}).get("content", "")
+            )
+            used_tokens = (result.get("usage") or {}).get("total_tokens")
+            if used_tokens is None:
+                used_tokens = count_tokens(self, prompt) + count_tokens(self, content)
+            RATE_LIMITER.settle(provider, reserved_tokens, used_tokens)
+            HEALTH_ROUTER.record(
+                provider, model, time.perf_counter() - sent_at, ok=True
+            )
+            logger.debug(f"API response: {json.dumps(result, indent=2)}")
+            record_llm_call(
+                self,
+                result.get("model", model),
+                prompt,
+                content,
+                result.get("usage"),
+                time.perf_counter() - started,
+                document_type,
+            )
+            return content
+        raise Exception(f"API error for every model tried. {'; '.join(errors)}")
+
+    def run_stream(
+        self, prompt, document_type=None, prefix=None, cross_provider=None, cancel=None
+    ):
+        """
+        Yields the completion in text chunks as the model produces them.
+        Setting cancel (a threading.Event) from another thread closes an API
+        response even while it is blocked reading, and ends the stream.
+        """
+        if self.is_local:
+            yield from self._run_local_stream(prompt, document_type, prefix)
+            return
+
+        started = time.perf_counter()
+        self._request_parts(prompt)
+        errors = []
+        for provider, model in self._routes(cross_provider):
+            try:
+                response, reserved_tokens, sent_at = self._post(
+                    provider, model, prompt, stream=True
+                )
             except requests.RequestException as e:
-                logger.error(f"Request error for {model}: {str(e)}")
+                logger.error(f"API error for {provider}/{model}: {str(e)}")
+                errors.append(f"{model}: {str(e)}")
+                continue
+
+            # Server-sent events: "data: {chunk}" lines, terminated by "data: [DONE]".
+            # Closing the generator early closes the response and its connection.
+            # Once text has been yielded there is no failing over to another model.
+            if cancel is not None:
+                close_response_on(cancel, response)
+            chunks = []
+            usage = None
+            model_used = model
+            status = "incomplete"
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith("data:"):
+                        continue
+                    data = line[len("data:") :].strip()
+                    if data == "[DONE]":
+                        # Read on to the end of the body: a response closed
+                        # before its last chunk takes its connection with it
+                        continue
+                    chunk = json.loads(data)
+                    usage = chunk.get("usage") or usage
+                    model_used = chunk.get("model", model_used)
+                    choices = chunk.get("choices") or [{}]
+                    text = choices[0].get("delta", {}).get("content")
+                    if text:
+                        chunks.append(text)
+                        yield text
+                status = "ok"
+            except Exception as e:
+                # A read cut short by cancel says nothing about the provider
+                if cancel is not None and cancel.is_set():
+                    return
+                if not isinstance(e, requests.RequestException):
+                    raise
+                status = "error"
+                logger.error(f"Stream error for {model}: {str(e)}")
                 raise Exception(f"API error for {model}: {str(e)}") from e
+            finally:
+                response.close()
+                used_tokens = (usage or {}).get("total_tokens")
+                if used_tokens is None:
+                    used_tokens = count_tokens(self, prompt) + count_tokens(
+                        self, "".join(chunks)
+                    )
+                RATE_LIMITER.settle(provider, reserved_tokens, used_tokens)
+                # Streams closed early by the consumer say nothing about health
+                if status != "incomplete":
+                    HEALTH_ROUTER.record(
+                        provider,
+                        model,
+                        time.perf_counter() - sent_at,
+                        ok=status == "ok",
+                    )
+                record_llm_call(
+                    self,
+                    model_used,
+                    prompt,
+                    "".join(chunks),
+                    usage,
+                    time.perf_counter() - started,
+                    document_type,
+                    status,
+                )
+            return
+        raise Exception(f"API error for every model tried. {'; '.join(errors)}")
 
+    def _run_local_stream(self, prompt, document_type=None, prefix=None):
+        started = time.perf_counter()
+        streamer = transformers.TextIteratorStreamer(
+            self.tokenizer, skip_prompt=True, skip_special_tokens=True
+        )
+        inputs = self._local_inputs(prompt, prefix)
+        cancelled = threading.Event()
+        errors = []
 
-# Initialize model agent
-def initialize_agent():
-    enabled_models = [
-        name for name, config in MODEL_CONFIG.items() if config["enabled"]
-    ]
-    if not enabled_models:
-        raise Exception("No models enabled in MODEL_CONFIG")
+        def stop_when_cancelled(input_ids, scores, **kwargs):
+            return torch.full(
+                (input_ids.shape[0],), cancelled.is_set(), dtype=torch.bool
+            )
 
-    model_name = enabled_models[0]
-    print(f"Using model: {model_name}")
-    return LLMModel(MODEL_CONFIG[model_name])
+        def generate():
+            try:
+                # inference_mode is thread-local, so it is entered on the worker
+                with torch.inference_mode():
+                    self.model.generate(
+                        **inputs,
+                        streamer=streamer,
+                        max_new_tokens=self.max_tokens,
+                        temperature=self.temperature,
+                        do_sample=True,
+                        stopping_criteria=transformers.StoppingCriteriaList(
+                            [stop_when_cancelled]
+                        ),
+                    )
+            except Exception as e:
+                errors.append(e)
+                # Unblock the consumer, which would otherwise wait forever
+                streamer.end()
 
+        worker = threading.Thread(target=generate, name="local-generate", daemon=True)
+        worker.start()
+        chunks = []
+        status = "incomplete"
+        try:
+            for text in streamer:
+                if text:
+                    chunks.append(text)
+                    yield text
+            status = "ok" if not errors else "error"
+        finally:
+            cancelled.set()
+            worker.join()
+            record_llm_call(
+                self,
+                self.model_name,
+                prompt,
+                "".join(chunks),
+                None,
+                time.perf_counter() - started,
+                document_type,
+                status,
+            )
+        if errors:
+            raise Exception(f"Local generation failed: {str(errors[0])}") from errors[0]
 
-# Updated generate_document function
-def generate_document(job_description, document_type, agent):
-    with open(DATA_FILE, "r") as f:
-        data = json.load(f)
 
-    if document_type == "Resume":
-        # Removed this from prompt as it is longing the prompt thereby using more tokens
-        # Web Search Results: {web_search_results}
-        # "overview": "A 2-3 sentence summary highlighting my most relevant skills, experiences, and achievements based on the job description. Use insights from the web search results to align with the company’s focus or job requirements.",
-        # "achievements": [
-        #     "Notable achievement 1",
-        #     "Notable achievement 2",
-        # ]
-        prompt = f"""
-        Here is my personal portfolio data:
-        Profile: {data['profile']['summary']}
-        Experiences: {json.dumps(data['experiences'], indent=2)}
-        Projects: {json.dumps(data['projects'], indent=2)}
-        Skills: {', '.join(data['skills'])}
-        Achievements: {json.dumps(data['achievements'], indent=2)}
+# One persistent requests.Session per provider, shared by all Streamlit sessions
+class ProviderSessions:
+    def __init__(self, pool_size, connect_timeout, read_timeout):
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        self._sessions = {}
+        self._stats = {}
+        self._lock = threading.Lock()
 
-        Job Description: {job_description}
+    def session(self, provider):
+        with self._lock:
+            session = self._sessions.get(provider)
+            if session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=self.pool_size, pool_maxsize=self.pool_size
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[provider] = session
+                self._stats[provider] = {
+                    "requests": 0,
+                    "new_connections": 0,
+                    "reused_connections": 0,
+                }
+            return session
 
-        Generate a JSON object for a tailored resume with the following structure:
-        {{
-            "work_experience": [
-                {{
-                    "role": "Role title",
-                    "company": "Company name",
-                    "duration": "Duration",
-                    "bullets": [
-                        "Relevant bullet point, highlighting a key achievement or responsibility in eact technology or other technology thats similar to requirement.",
-                        "another point",
-                        "...up to 9 points, at least 4, using absolute metrics or concrete numbers when possible."
-                    ]
-                }}
-                // ...repeat for 3 companies' experiences
-            ],
-            "projects": [
-                {{
-                    "name": "Project Name",
-                    "description": "Brief description (1 sentence) highlighting relevance to the job.",
-                    "technologies": ["Tech1", "Tech2", ...]
-                }}
-                // ...repeat for 3-4 most relevant projects
+    def post(self, provider, url, **kwargs):
+        """POSTs through the provider's pool and tags the response with
+        `connection_reused` (False when a new TCP/TLS handshake was made)."""
+        session = self.session(provider)
+        poolmanager = session.get_adapter(url).poolmanager
+        # Under concurrency another request may open a connection in between;
+        # the per-request flag is then approximate, the totals are not
+        opened_before = self._opened_connections(poolmanager)
+        kwargs.setdefault("timeout", self.timeout)
+        response = session.post(url, **kwargs)
+        new_connections = self._opened_connections(poolmanager) - opened_before
+        response.connection_reused = new_connections == 0
+        with self._lock:
+            stats = self._stats[provider]
+            stats["requests"] += 1
+            stats["new_connections"] += new_connections
+            stats["reused_connections"] += int(new_connections == 0)
+        logger.debug(
+            f"{provider} request to {url} "
+            f"{'reused a pooled connection' if response.connection_reused else 'opened a new connection'}"
+        )
+        return response
+
+    @staticmethod
+    def _opened_connections(poolmanager):
+        # Each session serves one provider, so its pools are that provider's hosts
+        total = 0
+        for pool_key in poolmanager.pools.keys():
+            pool = poolmanager.pools.get(pool_key)
+            if pool is not None:
+                total += pool.num_connections
+        return total
+
+    def stats(self):
+        with self._lock:
+            return {provider: dict(stats) for provider, stats in self._stats.items()}
+
+
+HTTP_SESSIONS = process_singleton(
+    "http_sessions",
+    lambda: ProviderSessions(
+        HTTP_CONFIG["pool_size"],
+        HTTP_CONFIG["connect_timeout"],
+        HTTP_CONFIG["read_timeout"],
+    ),
+)
+
+
+class _ModelHealth:
+    def __init__(self, window):
+        self.state = "closed"
+        self.outcomes = deque(maxlen=window)
+        self.latencies = deque(maxlen=window)
+        self.rate_limited = 0
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.probe_started = None
+
+
+# Per-model health and circuit breaker state shared by all sessions
+class HealthRouter:
+    def __init__(
+        self,
+        window,
+        min_samples,
+        max_error_rate,
+        max_consecutive_failures,
+        open_seconds,
+        default_latency_seconds,
+    ):
+        self.window = window
+        self.min_samples = min_samples
+        self.max_error_rate = max_error_rate
+        self.max_consecutive_failures = max_consecutive_failures
+        self.open_seconds = open_seconds
+        self.default_latency_seconds = default_latency_seconds
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _health(self, route):
+        health = self._models.get(route)
+        if health is None:
+            health = self._models[route] = _ModelHealth(self.window)
+        return health
+
+    def _score(self, health):
+        if health.latencies:
+            latency = sorted(health.latencies)[len(health.latencies) // 2]
+        else:
+            latency = self.default_latency_seconds
+        errors = 0.0
+        if health.outcomes:
+            errors = health.outcomes.count(False) / len(health.outcomes)
+        return latency * (1 + 2 * errors)
+
+    def order(self, routes):
+        """
+        Orders (provider, model, penalty) routes for one request, where the
+        first route is the selected model: closed circuits by score (median
+        latency inflated by errors, times penalty), plus at most one due
+        probe of an open circuit. A probe of the selected provider's own
+        models goes first; a probe of another provider's model only after
+        the selected provider's healthy routes. Other open circuits are
+        skipped. Returns (provider, model) pairs.
+        """
+        now = time.monotonic()
+        selected_provider = routes[0][0] if routes else None
+        probes, healthy, waits = [], [], []
+        with self._lock:
+            for index, (provider, model, penalty) in enumerate(routes):
+                health = self._health((provider, model))
+                if health.state == "closed":
+                    score = self._score(health) * penalty
+                    healthy.append((score, index, (provider, model)))
+                    continue
+                probe_due = now - health.opened_at >= self.open_seconds
+                # A probe that never reported back (e.g. an abandoned stream) expires
+                probe_stuck = (
+                    health.probe_started is not None
+                    and now - health.probe_started >= self.open_seconds
+                )
+                probe_free = health.probe_started is None or probe_stuck
+                if probe_due and probe_free and not probes:
+                    health.state = "half_open"
+                    health.probe_started = now
+                    probes.append((provider, model))
+                else:
+                    remaining = self.open_seconds - (now - health.opened_at)
+                    waits.append((provider, model, remaining))
+        ordered = [route for _, _, route in sorted(healthy)]
+        for probe in probes:
+            position = 0
+            if probe[0] != selected_provider:
+                own = [i for i, route in enumerate(ordered) if route[0] == selected_provider]
+                position = own[-1] + 1 if own else 0
+            ordered.insert(position, probe)
+        if not ordered:
+            retry_in = min(wait for _, _, wait in waits)
+            raise Exception(
+                "Every model is failing and temporarily disabled "
+                f"({', '.join(model for _, model, _ in waits)}). "
+                f"Retry in {max(1, math.ceil(retry_in))}s."
+            )
+        return ordered
+
+    def record(self, provider, model, latency, ok, status_code=None):
+        with self._lock:
+            health = self._health((provider, model))
+            health.outcomes.append(ok)
+            if ok:
+                health.latencies.append(latency)
+                health.consecutive_failures = 0
+            else:
+                health.consecutive_failures += 1
+                if status_code == 429:
+                    health.rate_limited += 1
+            if health.state == "half_open":
+                if ok:
+                    logger.info(
+                        f"Circuit for {provider}/{model} closed after a successful probe"
+                    )
+                    health.state = "closed"
+                    health.outcomes.clear()
+                    health.outcomes.append(True)
+                else:
+                    health.state = "open"
+                    health.opened_at = time.monotonic()
+                health.probe_started = None
+                return
+            if health.state == "closed" and not ok:
+                error_rate = health.outcomes.count(False) / len(health.outcomes)
+                if health.consecutive_failures >= self.max_consecutive_failures or (
+                    len(health.outcomes) >= self.min_samples
+                    and error_rate > self.max_error_rate
+                ):
+                    logger.warning(
+                        f"Circuit for {provider}/{model} opened "
+                        f"(error rate {error_rate:.0%}, "
+                        f"{health.consecutive_failures} in a row)"
+                    )
+                    health.state = "open"
+                    health.opened_at = time.monotonic()
+
+    def snapshot(self):
+        with self._lock:
+            rows = []
+            for (provider, model), health in self._models.items():
+                latencies = sorted(health.latencies)
+                error_rate = None
+                if health.outcomes:
+                    error_rate = health.outcomes.count(False) / len(health.outcomes)
+                rows.append(
+                    {
+                        "provider": provider,
+                        "model": model,
+                        "state": health.state,
+                        "p50_s": (
+                            round(latencies[len(latencies) // 2], 2) if latencies else None
+                        ),
+                        "error_rate": None if error_rate is None else round(error_rate, 2),
+                        "rate_limited": health.rate_limited,
+                        "samples": len(health.outcomes),
+                    }
+                )
+            return rows
+
+
+HEALTH_ROUTER = process_singleton(
+    "health_router",
+    lambda: HealthRouter(
+        ROUTER_CONFIG["window"],
+        ROUTER_CONFIG["min_samples"],
+        ROUTER_CONFIG["max_error_rate"],
+        ROUTER_CONFIG["max_consecutive_failures"],
+        ROUTER_CONFIG["open_seconds"],
+        ROUTER_CONFIG["default_latency_seconds"],
+    ),
+)
+
+
+# Pending calls wait in priority order; interactive UI requests go ahead of
+# background (batch) work
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+_CALL_CONTEXT = threading.local()
+
+
+@contextlib.contextmanager
+def call_priority(priority):
+    """Runs the provider calls made in this block at the given priority."""
+    previous = getattr(_CALL_CONTEXT, "priority", PRIORITY_INTERACTIVE)
+    _CALL_CONTEXT.priority = priority
+    try:
+        yield
+    finally:
+        _CALL_CONTEXT.priority = previous
+
+
+class _ProviderLimit:
+    def __init__(self, rpm, tpm):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.requests = float(rpm)
+        self.tokens = float(tpm)
+        self.refilled_at = time.monotonic()
+        self.blocked_until = 0.0
+        self.waiting = []
+        self.condition = threading.Condition()
+        self.stats = Counter()
+
+    def refill(self, now):
+        elapsed = now - self.refilled_at
+        self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+        self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+        self.refilled_at = now
+
+
+# Per-provider token buckets (requests/min and tokens/min) with a priority queue
+class RateLimiter:
+    def __init__(self, limits):
+        self._limits = {
+            provider: _ProviderLimit(limit["rpm"], limit["tpm"])
+            for provider, limit in limits.items()
+        }
+        self._sequence = iter(range(2**62))
+
+    def acquire(self, provider, tokens, priority=None):
+        """
+        Blocks until provider has budget for one request of `tokens` tokens
+        and no higher-priority call is waiting. Returns the seconds waited.
+        """
+        limit = self._limits.get(provider)
+        if limit is None:
+            return 0.0
+        if priority is None:
+            priority = getattr(_CALL_CONTEXT, "priority", PRIORITY_INTERACTIVE)
+        # A call larger than the whole minute budget waits for a full bucket
+        tokens = min(tokens, limit.tpm)
+        started = time.monotonic()
+        with limit.condition:
+            entry = (priority, next(self._sequence))
+            heapq.heappush(limit.waiting, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    limit.refill(now)
+                    if limit.waiting[0] == entry:
+                        delay = max(
+                            limit.blocked_until - now,
+                            (1 - limit.requests) * 60 / limit.rpm,
+                            (tokens - limit.tokens) * 60 / limit.tpm,
+                        )
+                        if delay <= 0:
+                            limit.requests -= 1
+                            limit.tokens -= tokens
+                            break
+                        limit.condition.wait(delay)
+                    else:
+                        limit.condition.wait()
+            finally:
+                limit.waiting.remove(entry)
+                heapq.heapify(limit.waiting)
+                limit.condition.notify_all()
+            waited = time.monotonic() - started
+            limit.stats["requests"] += 1
+            if waited > 0.01:
+                limit.stats["throttled"] += 1
+                limit.stats["waited_seconds"] += waited
+        return waited
+
+    def settle(self, provider, reserved_tokens, used_tokens):
+        """Returns the unused part of a token reservation to the bucket."""
+        limit = self._limits.get(provider)
+        if limit is None or used_tokens is None:
+            return
+        # acquire() never takes more than one minute's worth
+        taken = min(reserved_tokens, limit.tpm)
+        with limit.condition:
+            limit.tokens = min(limit.tpm, limit.tokens + taken - used_tokens)
+            limit.condition.notify_all()
+
+    def pause(self, provider, seconds):
+        """Holds every call to provider for `seconds`, e.g. after a 429."""
+        limit = self._limits.get(provider)
+        if limit is None:
+            return
+        with limit.condition:
+            limit.blocked_until = max(limit.blocked_until, time.monotonic() + seconds)
+            limit.stats["rate_limited"] += 1
+
+    def stats(self):
+        rows = []
+        for provider, limit in self._limits.items():
+            with limit.condition:
+                limit.refill(time.monotonic())
+                rows.append(
+                    {
+                        "provider": provider,
+                        "queued": len(limit.waiting),
+                        "requests_left": int(limit.requests),
+                        "tokens_left": int(limit.tokens),
+                        "throttled": limit.stats["throttled"],
+                        "waited_s": round(limit.stats["waited_seconds"], 1),
+                        "429s": limit.stats["rate_limited"],
+                    }
+                )
+        return rows
+
+
+RATE_LIMITER = process_singleton(
+    "rate_limiter", lambda: RateLimiter(RATE_LIMIT_CONFIG["limits"])
+)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def retry_delay(attempt, retry_after=None):
+    """
+    Jittered exponential backoff for the given retry attempt (0-based),
+    never shorter than a Retry-After header (seconds or HTTP date).
+    """
+    ceiling = min(
+        RATE_LIMIT_CONFIG["backoff_max_seconds"],
+        RATE_LIMIT_CONFIG["backoff_base_seconds"] * 2**attempt,
+    )
+    delay = random.uniform(ceiling / 2, ceiling)
+    if retry_after:
+        try:
+            requested = float(retry_after)
+        except ValueError:
+            try:
+                requested = (
+                    parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)
+                ).total_seconds()
+            except (TypeError, ValueError):
+                requested = 0.0
+        delay = max(delay, requested)
+    return delay
+
+
+def close_response_on(cancel, response):
+    """Closes a streaming response once cancel is set, from a watcher thread."""
+
+    def watch():
+        cancel.wait()
+        # close() waits for a read in progress on another thread; shutting the
+        # socket down (urllib3 >= 2.3) ends that read first
+        shutdown = getattr(response.raw, "shutdown", None)
+        if shutdown is not None:
+            try:
+                shutdown()
+            except (RuntimeError, OSError):
+                # Already released to the pool: the stream had finished
+                return
+        response.close()
+
+    threading.Thread(target=watch, name="response-cancel", daemon=True).start()
+
+
+class Ledger:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # Running aggregates for summary() and how far into the file they go
+        self._read_lock = threading.Lock()
+        self._file_id = None
+        self._offset = 0
+        self._by_day = {}
+        self._by_type = {}
+
+    def append(self, entry):
+        line = json.dumps(entry) + "\n"
+        # One O_APPEND write per entry keeps lines whole across processes
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def entries(self):
+        if not os.path.exists(self.path):
+            return []
+        entries = []
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    continue
+        return entries
+
+    def _catch_up(self):
+        """
+        Folds the lines appended since the last call into the aggregates, so
+        a rerun costs the new entries rather than the whole ledger. Other
+        processes' appends are picked up too; a truncated or replaced file
+        starts the aggregates over.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id != self._file_id or stat.st_size < self._offset:
+            self._file_id = file_id
+            self._offset = 0
+            self._by_day, self._by_type = {}, {}
+        if stat.st_size == self._offset:
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            data = f.read(stat.st_size - self._offset)
+        # A line still being written is left for the next call
+        complete = data[: data.rfind(b"\n") + 1]
+        self._offset += len(complete)
+        for line in complete.splitlines():
+            try:
+                self._add(json.loads(line))
+            except (ValueError, KeyError):
+                continue
+
+    def _add(self, entry):
+        day = entry["timestamp"][:10]
+        document_type = entry.get("document_type") or "other"
+        for groups, key in ((self._by_day, day), (self._by_type, document_type)):
+            group = groups.setdefault(
+                key,
+                {
+                    "calls": 0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "cost_usd": 0.0,
+                    "latency_total": 0.0,
+                },
+            )
+            group["calls"] += 1
+            group["prompt_tokens"] += entry["prompt_tokens"]
+            group["completion_tokens"] += entry["completion_tokens"]
+            group["cost_usd"] += entry["cost_usd"]
+            group["latency_total"] += entry["latency"]
+
+    def summary(self):
+        """Aggregates per day and per document type."""
+        def _rows(groups, label):
+            return [
+                {
+                    label: key,
+                    "calls": group["calls"],
+                    "prompt_tokens": group["prompt_tokens"],
+                    "completion_tokens": group["completion_tokens"],
+                    "cost_usd": round(group["cost_usd"], 4),
+                    "avg_latency_s": round(group["latency_total"] / group["calls"], 2),
+                }
+                for key, group in sorted(groups.items())
+            ]
+
+        with self._read_lock:
+            self._catch_up()
+            return {
+                "daily": _rows(self._by_day, "date"),
+                "by_document_type": _rows(self._by_type, "document_type"),
+            }
+
+
+LEDGER = process_singleton("ledger", lambda: Ledger(LEDGER_CONFIG["path"]))
+
+
+def _tiktoken_encoding():
+    # tiktoken is optional; without it API token counts fall back to estimates
+    cache = process_singleton("tiktoken_encoding", dict)
+    if "encoding" not in cache:
+        try:
+            import tiktoken
+
+            cache["encoding"] = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            cache["encoding"] = None
+    return cache["encoding"]
+
+
+def count_tokens(agent, text):
+    if agent.is_local:
+        return len(agent.tokenizer.encode(text, add_special_tokens=False))
+    encoding = _tiktoken_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return estimate_tokens(text)
+
+
+def record_llm_call(
+    agent, model_used, prompt, completion, usage, latency, document_type=None, status="ok"
+):
+    """Appends one call to the ledger, preferring the provider's usage field."""
+    usage = usage or {}
+    prompt_tokens = usage.get("prompt_tokens")
+    completion_tokens = usage.get("completion_tokens")
+    usage_source = "provider"
+    if prompt_tokens is None or completion_tokens is None:
+        usage_source = "local"
+        prompt_tokens = count_tokens(agent, prompt)
+        completion_tokens = count_tokens(agent, completion) if completion else 0
+    prompt_price, completion_price = LEDGER_CONFIG["pricing"].get(model_used, (0.0, 0.0))
+    entry = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "provider": agent.provider,
+        "model_requested": agent.model_name,
+        "model_used": model_used,
+        "document_type": document_type,
+        "status": status,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "usage_source": usage_source,
+        "latency": round(latency, 3),
+        "cost_usd": round(
+            (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6,
+            6,
+        ),
+    }
+    try:
+        LEDGER.append(entry)
+    except OSError as e:
+        logger.warning(f"Could not write LLM ledger entry: {str(e)}")
+    return entry
+
+
+# Content-addressed byte store on disk with TTL and size-bounded eviction
+class DiskCache:
+    """
+    Entries expire ttl_seconds after they were written (their mtime) and are
+    evicted least-recently-read first (their atime, set on every hit).
+    """
+
+    def __init__(self, directory, max_bytes, ttl_seconds, sweep_interval_seconds=3600):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # Writes only walk the cache once it may be over max_bytes, or when
+        # expired entries have not been swept for this long
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._estimated_bytes = None
+        self._swept_at = 0.0
+
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256(
+            json.dumps(parts, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            stat = os.stat(path)
+            if time.time() - stat.st_mtime > self.ttl_seconds:
+                os.remove(path)
+                self._count(False)
+                return None
+            with open(path, "rb") as f:
+                value = f.read()
+            # Reads move the access time only; the mtime stays the write time
+            os.utime(path, ns=(time.time_ns(), stat.st_mtime_ns))
+        except FileNotFoundError:
+            self._count(False)
+            return None
+        self._count(True)
+        return value
+
+    def set(self, key, value):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file in the same directory and rename over the
+        # target, so concurrent readers in any process never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        with self._lock:
+            if self._estimated_bytes is not None:
+                self._estimated_bytes += len(value)
+            due = (
+                self._estimated_bytes is None
+                or self._estimated_bytes > self.max_bytes
+                or time.monotonic() - self._swept_at > self.sweep_interval_seconds
+            )
+        if due:
+            self.evict()
+
+    def evict(self):
+        """Removes expired entries, then least recently read ones above max_bytes."""
+        now = time.time()
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.startswith(".tmp-"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                    if now - stat.st_mtime > self.ttl_seconds:
+                        os.remove(path)
+                        continue
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        # Trim below the cap so the next writes do not trigger a walk each
+        target = self.max_bytes * 0.9 if total > self.max_bytes else self.max_bytes
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        with self._lock:
+            self._estimated_bytes = total
+            self._swept_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses}
+
+
+RESPONSE_CACHE = process_singleton(
+    "response_cache",
+    lambda: DiskCache(
+        RESPONSE_CACHE_CONFIG["directory"],
+        RESPONSE_CACHE_CONFIG["max_mb"] * 2**20,
+        RESPONSE_CACHE_CONFIG["ttl_seconds"],
+    ),
+)
+
+
+def response_cache_key(agent, prompt):
+    return DiskCache.key(
+        agent.provider, agent.model_name, prompt, agent.temperature, agent.max_tokens
+    )
+
+
+# Run a prompt through the response cache unless bypassed
+def cached_run(agent, prompt, bypass_cache=False, document_type=None, prefix=None):
+    key = response_cache_key(agent, prompt)
+    if not bypass_cache:
+        cached = RESPONSE_CACHE.get(key)
+        if cached is not None:
+            logger.debug(f"Response cache hit for {agent.model_name}")
+            return cached.decode("utf-8")
+    response = agent.run_sync(prompt, document_type=document_type, prefix=prefix)
+    if response:
+        RESPONSE_CACHE.set(key, response.encode("utf-8"))
+    return response
+
+
+def configure_torch_threads(num_threads=None, interop_threads=None):
+    """Pins torch's intra-op and inter-op CPU thread pools."""
+    num_threads = num_threads or os.cpu_count() or 1
+    torch.set_num_threads(num_threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            # Only settable once, before any inter-op parallel work has run
+            logger.debug("torch inter-op thread count already fixed for this process")
+    logger.debug(
+        f"torch threads: {torch.get_num_threads()} intra-op, "
+        f"{torch.get_num_interop_threads()} inter-op"
+    )
+
+
+def benchmark_local_inference(
+    prompt, modes=("baseline", "optimized"), max_new_tokens=64, runs=3
+):
+    """
+    Loads the local model once per inference mode and measures decode speed
+    on the same prompt. Every run generates exactly max_new_tokens greedily so
+    the modes are compared on equal work.
+    Returns: {mode: {"load_seconds", "tokens_per_second", "memory_mb"}}
+    """
+    results = {}
+    for mode in modes:
+        started = time.perf_counter()
+        model = LLMModel(dict(MODEL_CONFIG["local"], inference_mode=mode), provider="local")
+        load_seconds = time.perf_counter() - started
+        inputs = model.tokenizer(prompt, return_tensors="pt")
+        timings = []
+        with torch.inference_mode():
+            # The first call warms up allocator and (optionally) compiled graphs
+            for run in range(runs + 1):
+                started = time.perf_counter()
+                model.model.generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,
+                    min_new_tokens=max_new_tokens,
+                    do_sample=False,
+                )
+                if run:
+                    timings.append(time.perf_counter() - started)
+        best = min(timings)
+        results[mode] = {
+            "load_seconds": round(load_seconds, 2),
+            "tokens_per_second": round(max_new_tokens / best, 2),
+            "memory_mb": round(model.memory_footprint() / 2**20, 1),
+        }
+        logger.info(f"Local inference benchmark [{mode}]: {results[mode]}")
+        del model
+    return results
+
+
+class _RegistryEntry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.model = None
+        # Lease id -> when its session last used the model
+        self.leases = {}
+        self.last_used = time.monotonic()
+        self.size_bytes = 0
+
+
+# Process-wide, thread-safe cache of LLMModel instances keyed by provider and config
+class ModelRegistry:
+    def __init__(self, max_memory_bytes, idle_ttl_seconds):
+        self.max_memory_bytes = max_memory_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def _key(provider, model_config):
+        # The config (including the API key) only ever leaves memory as a digest
+        digest = hashlib.sha256(
+            json.dumps(model_config, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        return (provider, digest)
+
+    def _entry(self, provider):
+        if provider not in MODEL_CONFIG:
+            raise Exception(f"Unknown model provider: {provider}")
+        model_config = MODEL_CONFIG[provider]
+        key = self._key(provider, model_config)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _RegistryEntry()
+            self._entries.move_to_end(key)
+            entry.last_used = time.monotonic()
+        return key, model_config, entry
+
+    def get(self, provider):
+        """Returns the shared LLMModel for provider, loading it on first use."""
+        key, model_config, entry = self._entry(provider)
+        # Loading happens under the per-entry lock so concurrent sessions wait
+        # for one load instead of each reading the weights themselves
+        with entry.lock:
+            if entry.model is None:
+                started = time.perf_counter()
+                entry.model = LLMModel(model_config, provider=provider)
+                entry.size_bytes = entry.model.memory_footprint()
+                logger.info(
+                    f"Loaded {provider} model {model_config['model_name']} in "
+                    f"{time.perf_counter() - started:.2f}s "
+                    f"({entry.size_bytes / 2**20:.0f} MB)"
+                )
+            model = entry.model
+        self.evict(keep=key)
+        return model
+
+    def acquire(self, provider, lease_id):
+        """
+        Like get(), but holds (or renews) the lease lease_id so the model is
+        not evicted. A lease that is not renewed within the idle TTL lapses,
+        so sessions that go away without releasing do not pin the model.
+        """
+        model = self.get(provider)
+        key, _, entry = self._entry(provider)
+        with self._lock:
+            entry.leases[lease_id] = time.monotonic()
+        return model
+
+    def release(self, provider, lease_id):
+        if provider not in MODEL_CONFIG:
+            return
+        key = self._key(provider, MODEL_CONFIG[provider])
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.leases.pop(lease_id, None) is not None:
+                entry.last_used = time.monotonic()
+
+    def warm_up(self, providers, background=True):
+        """Loads the given providers ahead of the first request."""
+
+        def _load():
+            for provider in providers:
+                try:
+                    self.get(provider)
+                except Exception as e:
+                    logger.warning(f"Warm-up failed for {provider}: {str(e)}")
+
+        if background:
+            threading.Thread(target=_load, name="model-warm-up", daemon=True).start()
+        else:
+            _load()
+
+    def evict(self, keep=None):
+        """Drops idle unreferenced models, then LRU models above the memory cap."""
+        now = time.monotonic()
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                for lease_id, renewed_at in list(entry.leases.items()):
+                    if now - renewed_at > self.idle_ttl_seconds:
+                        del entry.leases[lease_id]
+                if key == keep or entry.leases:
+                    continue
+                if now - entry.last_used > self.idle_ttl_seconds:
+                    del self._entries[key]
+                    logger.info(f"Evicted idle model {key[0]}")
+            total = sum(e.size_bytes for e in self._entries.values())
+            # Unreferenced models go first; referenced ones only once they
+            # have been idle past the TTL (their sessions are likely gone)
+            for only_unreferenced in (True, False):
+                for key, entry in list(self._entries.items()):
+                    if total <= self.max_memory_bytes:
+                        return
+                    if key == keep or entry.size_bytes == 0:
+                        continue
+                    if only_unreferenced and entry.leases:
+                        continue
+                    if (
+                        not only_unreferenced
+                        and now - entry.last_used <= self.idle_ttl_seconds
+                    ):
+                        continue
+                    del self._entries[key]
+                    total -= entry.size_bytes
+                    logger.info(f"Evicted model {key[0]} to stay under memory cap")
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "provider": key[0],
+                    "loaded": entry.model is not None,
+                    "refs": len(entry.leases),
+                    "idle_seconds": round(now - entry.last_used, 1),
+                    "memory_mb": round(entry.size_bytes / 2**20, 1),
+                }
+                for key, entry in self._entries.items()
+            ]
+
+
+def _create_model_registry():
+    registry = ModelRegistry(
+        REGISTRY_CONFIG["max_memory_mb"] * 2**20,
+        REGISTRY_CONFIG["idle_ttl_seconds"],
+    )
+    warm_up = [p for p in REGISTRY_CONFIG["warm_up"] if p in MODEL_CONFIG]
+    if warm_up:
+        registry.warm_up(warm_up)
+    return registry
+
+
+MODEL_REGISTRY = process_singleton("model_registry", _create_model_registry)
+
+
+# Initialize model agent
+def initialize_agent():
+    enabled_models = [
+        name for name, config in MODEL_CONFIG.items() if config["enabled"]
+    ]
+    if not enabled_models:
+        raise Exception("No models enabled in MODEL_CONFIG")
+
+    model_name = enabled_models[0]
+    print(f"Using model: {model_name}")
+    return MODEL_REGISTRY.get(model_name)
+
+
+# Build the generation prompt for a job description and document type
+def build_prompt(
+    job_description, document_type, use_retrieval=None, selection=None, additional=""
+):
+    """
+    selection overrides retrieval with a fixed set of portfolio items;
+    additional is portfolio text placed after the job description.
+    """
+    if use_retrieval is None:
+        use_retrieval = RETRIEVAL_CONFIG["enabled"]
+    snapshot = PORTFOLIO_STORE.load()
+    if selection is not None:
+        sections = snapshot.render_sections(selection)
+    elif use_retrieval:
+        sections = snapshot.render_sections(
+            select_portfolio(snapshot, job_description)
+        )
+    else:
+        sections = snapshot.sections
+
+    if document_type == "Resume":
+        # Removed this from prompt as it is longing the prompt thereby using more tokens
+        # Web Search Results: {web_search_results}
+        # "overview": "A 2-3 sentence summary highlighting my most relevant skills, experiences, and achievements based on the job description. Use insights from the web search results to align with the company’s focus or job requirements.",
+        # "achievements": [
+        #     "Notable achievement 1",
+        #     "Notable achievement 2",
+        # ]
+        prompt = f"""
+        Here is my personal portfolio data:
+        Profile: {sections['summary']}
+        Experiences: {sections['experiences']}
+        Projects: {sections['projects']}
+        Skills: {sections['skills']}
+        Achievements: {sections['achievements']}
+
+        Job Description: {job_description}{additional}
+
+        Generate a JSON object for a tailored resume with the following structure:
+        {{
+            "work_experience": [
+                {{
+                    "role": "Role title",
+                    "company": "Company name",
+                    "duration": "Duration",
+                    "bullets": [
+                        "Relevant bullet point, highlighting a key achievement or responsibility in eact technology or other technology thats similar to requirement.",
+                        "another point",
+                        "...up to 9 points, at least 4, using absolute metrics or concrete numbers when possible."
+                    ]
+                }}
+                // ...repeat for 3 companies' experiences
+            ],
+            "projects": [
+                {{
+                    "name": "Project Name",
+                    "description": "Brief description (1 sentence) highlighting relevance to the job.",
+                    "technologies": ["Tech1", "Tech2", ...]
+                }}
+                // ...repeat for 3-4 most relevant projects
             ],
             "skills": {{
                 "Category1": ["Skill1", "Skill2", ...],
@@ -665,44 +2701,1541 @@ def generate_document(job_description, document_type, agent):
         - All sections must be present in the JSON, even if empty.
         """
     else:
-        prompt = f"""
-        You are an expert career assistant with access to my personal portfolio and web search capabilities. My details are:
-        Info: {json.dumps(data["profile"], indent=2)}
-        Profile: {data['profile']['summary']}
-        Experiences: {json.dumps(data['experiences'], indent=2)}
-        Projects: {json.dumps(data['projects'], indent=2)}
-        Skills: {', '.join(data['skills'])}
-        Achievements: {json.dumps(data['achievements'], indent=2)}
+        prompt = f"""
+        You are an expert career assistant with access to my personal portfolio and web search capabilities. My details are:
+        Info: {sections['info']}
+        Profile: {sections['summary']}
+        Experiences: {sections['experiences']}
+        Projects: {sections['projects']}
+        Skills: {sections['skills']}
+        Achievements: {sections['achievements']}
+
+        Job Description: {job_description}{additional}
+
+        Task: Generate a {document_type} tailored to the job description. Follow these steps:
+        1. Analyze the job description to identify key skills, technologies, and responsibilities.
+        2. Match my skills, experiences, projects, and achievements to the job requirements.
+        3. Perform a web search to gather additional context about the company or role.
+        4. Structure the {document_type} to highlight relevant qualifications and achievements.
+        5. Use a professional tone and ensure the content is concise and impactful.
+        6. Keep it short length and use simple words and sentences.
+        7. It must sound like a human and should not sound even a bit like an AI generated.
+        8. Figure out the comapny's name from the job description and use it in the {document_type} wherever applicable.
+        9. Use the web search results to get more details about the company to use them in the {document_type}.
+        10. The length of the {document_type} should be 2-3 paragraphs with minimal and impressive content.
+        11. Dont keep it generic. Write it according to me, the role and the company.
+        12. Make it sound naturally human written.
+        13. For a requirement in the job description which is not present in my skills or experiences mention find and mention relevant ones from my skill and say that I am a fast learner with a great grasping power and I can learn it easily.
+        14. Mention that I was the co-founder of a startup and maintained it for 4 years while completing my bachelors and masters and that managerial and leadership skills will add a great value.
+
+        Provide the {document_type} below:
+        """
+    return prompt
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text
+    return max(1, len(text) // 4)
+
+
+def _search_terms(text):
+    return [t.strip(".") for t in re.findall(r"[a-z0-9][a-z0-9+#.]*", text.lower())]
+
+
+# BM25 index over experience bullets, projects, skills and achievements
+class PortfolioIndex:
+    def __init__(self, data, k1, b):
+        self.k1 = k1
+        self.b = b
+        # (kind, experience index or None, item) per searchable item
+        self.items = []
+        for i, exp in enumerate(data.get("experiences", [])):
+            for bullet in exp["description"]:
+                self.items.append(("bullet", i, bullet))
+        for proj in data.get("projects", []):
+            self.items.append(("project", None, proj))
+        for skill in data.get("skills", []):
+            self.items.append(("skill", None, skill))
+        for ach in data.get("achievements", []):
+            self.items.append(("achievement", None, ach))
+
+        self.documents = [_search_terms(self._text(item)) for item in self.items]
+        self.average_length = sum(len(d) for d in self.documents) / max(
+            1, len(self.documents)
+        )
+        self.term_counts = [Counter(d) for d in self.documents]
+        document_frequency = Counter()
+        for doc in self.documents:
+            document_frequency.update(set(doc))
+        n = len(self.documents)
+        self.idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    @staticmethod
+    def _text(item):
+        kind, _, value = item
+        if kind == "project":
+            return f"{value['name']} {value['description']} {' '.join(value['technologies'])}"
+        return value
+
+    def scores(self, query):
+        terms = set(_search_terms(query))
+        scores = []
+        for doc, counts in zip(self.documents, self.term_counts):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * len(doc) / self.average_length)
+            for term in terms:
+                tf = counts.get(term)
+                if tf:
+                    score += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            scores.append(score)
+        return scores
+
+
+def _json_list(fragments, indent=""):
+    # Same layout as json.dumps(list, indent=2) for pre-rendered items
+    if not fragments:
+        return "[]"
+    return "[\n" + ",\n".join(fragments) + f"\n{indent}]"
+
+
+# Parsed personal data plus pre-rendered prompt fragments for one data version
+class PortfolioSnapshot:
+    def __init__(self, data, version):
+        self.data = data
+        self.version = version
+        self.index = PortfolioIndex(data, RETRIEVAL_CONFIG["k1"], RETRIEVAL_CONFIG["b"])
+        self.item_fragments = [self._render_item(item) for item in self.index.items]
+        self.item_tokens = [estimate_tokens(f) for f in self.item_fragments]
+        self.experience_headers = [
+            [
+                f"    {json.dumps(key)}: {json.dumps(value)}"
+                for key, value in exp.items()
+                if key != "description"
+            ]
+            for exp in data.get("experiences", [])
+        ]
+        self.summary = data["profile"]["summary"]
+        self.info = json.dumps(data["profile"], indent=2)
+        self.experience_header_tokens = sum(
+            estimate_tokens("\n".join(lines)) for lines in self.experience_headers
+        )
+        self.sections = self.render_sections(range(len(self.index.items)))
+        self.section_tokens = {
+            name: estimate_tokens(text) for name, text in self.sections.items()
+        }
+
+    @staticmethod
+    def _render_item(item):
+        kind, _, value = item
+        if kind == "bullet":
+            return "      " + json.dumps(value)
+        if kind == "project":
+            return textwrap.indent(json.dumps(value, indent=2), "  ")
+        if kind == "achievement":
+            return "  " + json.dumps(value)
+        return value
+
+    def render_items(self, selected):
+        """The selected index items as a labelled list, one per line."""
+        lines = []
+        for i in sorted(selected):
+            kind, exp_index, value = self.index.items[i]
+            if kind == "bullet":
+                company = self.data["experiences"][exp_index].get("company", "")
+                lines.append(f"- Experience at {company}: {value}")
+            elif kind == "project":
+                lines.append(f"- Project: {json.dumps(value)}")
+            else:
+                lines.append(f"- {kind.capitalize()}: {value}")
+        return "\n".join(lines)
+
+    def render_sections(self, selected):
+        """Joins the pre-rendered fragments of the selected index items."""
+        bullets = [[] for _ in self.experience_headers]
+        grouped = {"project": [], "skill": [], "achievement": []}
+        for i in sorted(selected):
+            kind, exp_index, _ = self.index.items[i]
+            if kind == "bullet":
+                bullets[exp_index].append(self.item_fragments[i])
+            else:
+                grouped[kind].append(self.item_fragments[i])
+        experiences = [
+            "  {\n"
+            + ",\n".join(
+                header + [f'    "description": {_json_list(items, "    ")}']
+            )
+            + "\n  }"
+            for header, items in zip(self.experience_headers, bullets)
+        ]
+        return {
+            "summary": self.summary,
+            "info": self.info,
+            "experiences": _json_list(experiences),
+            "projects": _json_list(grouped["project"]),
+            "skills": ", ".join(grouped["skill"]),
+            "achievements": _json_list(grouped["achievement"]),
+        }
+
+
+# Caches the parsed DATA_FILE, invalidated by mtime/size and content hash
+class PortfolioStore:
+    def __init__(self, path):
+        self.path = path
+        self._stat = None
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        stat = os.stat(self.path)
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if self._snapshot is not None and stat_key == self._stat:
+                return self._snapshot
+            with open(self.path, "rb") as f:
+                raw = f.read()
+            version = hashlib.sha256(raw).hexdigest()
+            # A touched but unchanged file keeps the existing fragments
+            if self._snapshot is None or self._snapshot.version != version:
+                self._snapshot = PortfolioSnapshot(json.loads(raw), version)
+                logger.debug(f"Rendered prompt fragments for data version {version[:12]}")
+            self._stat = stat_key
+            return self._snapshot
+
+
+PORTFOLIO_STORE = process_singleton("portfolio_store", lambda: PortfolioStore(DATA_FILE))
+
+
+def _retrieval_minimum(kind):
+    # Items of each kind (bullets: per experience) retrieval always keeps
+    return RETRIEVAL_CONFIG[
+        {
+            "bullet": "min_bullets_per_experience",
+            "project": "min_projects",
+            "skill": "min_skills",
+            "achievement": "min_achievements",
+        }[kind]
+    ]
+
+
+def select_portfolio(
+    snapshot, job_description, token_budget=None, base=(), strict=False
+):
+    """
+    Returns the index items to include for job_description: every experience
+    keeps its best bullets, and the most relevant projects, skills and
+    achievements are added while they fit in token_budget. Items in base are
+    always included and count towards the minimums and the budget. With
+    strict, the minimums have to fit in token_budget too.
+    """
+    token_budget = token_budget or RETRIEVAL_CONFIG["token_budget"]
+    index = snapshot.index
+    scores = index.scores(job_description)
+    ranked = sorted(range(len(index.items)), key=lambda i: scores[i], reverse=True)
+
+    selected = set(base)
+    used = snapshot.section_tokens["summary"] + snapshot.experience_header_tokens
+    used += sum(snapshot.item_tokens[i] for i in base)
+    kept = Counter((index.items[i][0], index.items[i][1]) for i in base)
+    for i in ranked:
+        if i in selected:
+            continue
+        kind, exp_index, _ = index.items[i]
+        group = (kind, exp_index)
+        if kept[group] < _retrieval_minimum(kind):
+            if strict and used + snapshot.item_tokens[i] > token_budget:
+                continue
+            kept[group] += 1
+            selected.add(i)
+            used += snapshot.item_tokens[i]
+    for i in ranked:
+        if scores[i] <= 0:
+            break
+        if i in selected:
+            continue
+        cost = snapshot.item_tokens[i]
+        if used + cost > token_budget:
+            continue
+        selected.add(i)
+        used += cost
+    logger.debug(
+        f"Portfolio retrieval kept {len(selected)}/{len(index.items)} items "
+        f"(~{used} tokens, budget {token_budget})"
+    )
+    return selected
+
+
+# Both prompt templates put the portfolio first and the job description after it
+PROMPT_SPLIT_MARKER = "\n\n        Job Description: "
+
+
+@functools.lru_cache(maxsize=8)
+def core_portfolio(snapshot, token_budget):
+    """
+    The job-independent part of the portfolio: up to the per-kind minimums
+    of items in portfolio order, cheaper kinds first, within token_budget.
+    """
+    index = snapshot.index
+    used = snapshot.section_tokens["summary"] + snapshot.experience_header_tokens
+    kept = Counter()
+    selected = set()
+    for kind in ("bullet", "skill", "achievement", "project"):
+        for i, (item_kind, exp_index, _) in enumerate(index.items):
+            if item_kind != kind or kept[(kind, exp_index)] >= _retrieval_minimum(kind):
+                continue
+            if used + snapshot.item_tokens[i] > token_budget:
+                continue
+            kept[(kind, exp_index)] += 1
+            selected.add(i)
+            used += snapshot.item_tokens[i]
+    return frozenset(selected)
+
+
+def agent_prompt(agent, job_description, document_type):
+    """
+    Returns (prompt, prefix). For a local model with prefix caching the
+    portfolio before the job description is a job-independent core, so the
+    prefix is identical across requests and its KV cache can be reused. The
+    items retrieval picks for this posting follow the job description. Both
+    stay within the retrieval budget and the model's context window.
+    """
+    if not (agent.is_local and agent.prefix_cache_size):
+        return build_prompt(job_description, document_type), None
+    snapshot = PORTFOLIO_STORE.load()
+    token_budget = RETRIEVAL_CONFIG["token_budget"]
+    base_tokens = snapshot.section_tokens["summary"] + snapshot.experience_header_tokens
+    limit = agent.context_window and agent.context_window - agent.max_tokens
+    core_budget = token_budget
+    if limit:
+        # Sized without the posting, so the core stays the same for every job
+        template = build_prompt("", document_type, selection=())
+        template_tokens = count_tokens(agent, template)
+        # Portfolio budgets are in estimate_tokens units, not the model's
+        ratio = estimate_tokens(template) / max(1, template_tokens)
+        room = limit - template_tokens - RETRIEVAL_CONFIG["prefix_reserve_tokens"]
+        core_budget = min(token_budget, base_tokens + int(max(0, room) * ratio))
+    core = core_portfolio(snapshot, core_budget)
+    prompt = build_prompt(job_description, document_type, selection=core)
+    prefix = prompt[: prompt.index(PROMPT_SPLIT_MARKER)]
+    if limit:
+        room = limit - count_tokens(agent, prompt)
+        core_tokens = base_tokens + sum(snapshot.item_tokens[i] for i in core)
+        token_budget = min(token_budget, core_tokens + int(max(0, room) * ratio))
+        if room < 0:
+            logger.warning(
+                f"Prompt exceeds {agent.model_name}'s context by {-room} tokens"
+            )
+    while True:
+        extra = select_portfolio(
+            snapshot, job_description, token_budget, base=core, strict=bool(limit)
+        )
+        extra -= core
+        if not extra:
+            return prompt, prefix
+        additional = (
+            "\n\n        More of my portfolio relevant to this job:\n"
+            + snapshot.render_items(extra)
+        )
+        extended = build_prompt(
+            job_description, document_type, selection=core, additional=additional
+        )
+        # Budgets are estimates; shrink until the model's tokenizer agrees
+        overflow = count_tokens(agent, extended) - limit if limit else 0
+        if overflow <= 0:
+            return extended, prefix
+        token_budget -= max(1, int(overflow * ratio))
+
+
+RESUME_SECTIONS = ["work_experience", "projects", "skills"]
+_MINHASH_PRIME = (1 << 61) - 1
+
+
+def normalize_job_description(text):
+    text = re.sub(r"https?://\S+", " ", text.lower())
+    return " ".join(re.findall(r"[a-z0-9+#]+", text))
+
+
+# Persistent MinHash/LSH index of job descriptions with their resume JSON
+class SimilarJobIndex:
+    def __init__(self, path, threshold, shingle_size, num_perm, bands, max_entries):
+        self.path = path
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.rows = num_perm // bands
+        self.bands = bands
+        self.max_entries = max_entries
+        # Fixed seed: signatures are stored on disk and must stay comparable
+        rng = random.Random(1)
+        self._permutations = [
+            (rng.randrange(1, _MINHASH_PRIME), rng.randrange(0, _MINHASH_PRIME))
+            for _ in range(num_perm)
+        ]
+        self._entries = []
+        self._buckets = {}
+        self._loaded_mtime = None
+        self._lock = threading.Lock()
+
+    def signature(self, text):
+        words = normalize_job_description(text).split()
+        size = min(self.shingle_size, max(1, len(words)))
+        shingles = {
+            " ".join(words[i : i + size]) for i in range(max(1, len(words) - size + 1))
+        }
+        hashes = [
+            int.from_bytes(
+                hashlib.blake2b(shingle.encode(), digest_size=8).digest(), "little"
+            )
+            for shingle in shingles
+        ]
+        return [
+            min((a * h + b) % _MINHASH_PRIME for h in hashes)
+            for a, b in self._permutations
+        ]
+
+    def _band_keys(self, signature):
+        return [
+            (band, tuple(signature[band * self.rows : (band + 1) * self.rows]))
+            for band in range(self.bands)
+        ]
+
+    def _index(self, position, entry):
+        for key in self._band_keys(entry["signature"]):
+            self._buckets.setdefault(key, []).append(position)
+
+    def _reload_if_changed(self):
+        # Other processes (batch runs, other Streamlit workers) append too
+        try:
+            mtime = os.path.getmtime(self.path)
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._loaded_mtime:
+            return
+        entries = []
+        if mtime is not None:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        continue
+        self._entries, self._buckets = [], {}
+        for entry in entries:
+            self._entries.append(entry)
+            self._index(len(self._entries) - 1, entry)
+        self._loaded_mtime = mtime
+
+    def find(self, job_description):
+        """
+        Returns the most similar earlier posting at or above the threshold as
+        {"similarity", "job_description", "document", "created"}, or None.
+        """
+        signature = self.signature(job_description)
+        with self._lock:
+            self._reload_if_changed()
+            candidates = set()
+            for key in self._band_keys(signature):
+                candidates.update(self._buckets.get(key, ()))
+            best, best_similarity = None, 0.0
+            for position in candidates:
+                entry = self._entries[position]
+                agreeing = sum(
+                    1 for x, y in zip(signature, entry["signature"]) if x == y
+                )
+                similarity = agreeing / len(signature)
+                if similarity > best_similarity:
+                    best, best_similarity = entry, similarity
+        if best is None or best_similarity < self.threshold:
+            return None
+        return {
+            "similarity": best_similarity,
+            "job_description": best["job_description"],
+            "document": best["document"],
+            "created": best["created"],
+        }
+
+    def add(self, job_description, document):
+        """Remembers a generated resume; unparseable output is not stored."""
+        try:
+            resume = parse_llm_json(document)
+        except Exception:
+            return
+        if not isinstance(resume, dict) or not resume.get("work_experience"):
+            return
+        entry = {
+            "id": hashlib.sha256(
+                normalize_job_description(job_description).encode()
+            ).hexdigest(),
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "job_description": job_description,
+            "document": document,
+            "signature": self.signature(job_description),
+        }
+        with self._lock:
+            self._reload_if_changed()
+            # The latest resume for a posting replaces the earlier one
+            entries = [e for e in self._entries if e["id"] != entry["id"]]
+            entries.append(entry)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            appended = len(entries) == len(self._entries) + 1
+            if appended and len(entries) <= self.max_entries:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+            else:
+                entries = entries[-self.max_entries :]
+                fd, tmp_path = tempfile.mkstemp(
+                    dir=os.path.dirname(self.path) or ".", prefix=".tmp-"
+                )
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    for e in entries:
+                        f.write(json.dumps(e) + "\n")
+                os.replace(tmp_path, self.path)
+            self._entries, self._buckets = [], {}
+            for e in entries:
+                self._entries.append(e)
+                self._index(len(self._entries) - 1, e)
+            self._loaded_mtime = os.path.getmtime(self.path)
+
+    def __len__(self):
+        with self._lock:
+            self._reload_if_changed()
+            return len(self._entries)
+
+
+SIMILAR_JOBS = process_singleton(
+    "similar_jobs",
+    lambda: SimilarJobIndex(
+        SIMILAR_JOBS_CONFIG["path"],
+        SIMILAR_JOBS_CONFIG["threshold"],
+        SIMILAR_JOBS_CONFIG["shingle_size"],
+        SIMILAR_JOBS_CONFIG["num_perm"],
+        SIMILAR_JOBS_CONFIG["bands"],
+        SIMILAR_JOBS_CONFIG["max_entries"],
+    ),
+)
+
+
+def build_refresh_prompt(job_description, previous_resume, sections):
+    """Prompt that rewrites only `sections` of a resume made for a similar posting."""
+    snapshot = PORTFOLIO_STORE.load()
+    if RETRIEVAL_CONFIG["enabled"]:
+        portfolio = snapshot.render_sections(
+            select_portfolio(snapshot, job_description)
+        )
+    else:
+        portfolio = snapshot.sections
+    sources = {
+        "work_experience": f"Experiences: {portfolio['experiences']}",
+        "projects": f"Projects: {portfolio['projects']}",
+        "skills": f"Skills: {portfolio['skills']}",
+    }
+    portfolio_text = "\n        ".join(sources[section] for section in sections)
+    previous = json.dumps(
+        {section: previous_resume.get(section) for section in sections}, indent=2
+    )
+    keys = ", ".join(f'"{section}"' for section in sections)
+    return f"""
+        Here is the relevant part of my personal portfolio data:
+        {portfolio_text}
+
+        Job Description: {job_description}
+
+        These resume sections were written for a very similar job description:
+        {previous}
+
+        Update them for the job description above. Keep entries that still fit
+        and change wording, ordering and selection where the requirements differ.
+        Output a JSON object with the keys {keys}, "company_name" and "role_name",
+        using the same structure as above. Only output valid JSON, no markdown or extra text.
+        """
+
+
+def refresh_resume_sections(
+    job_description, previous_document, sections, agent, bypass_cache=False
+):
+    """Regenerates only `sections` of an earlier resume; returns merged JSON text."""
+    previous = parse_llm_json(previous_document)
+    response = cached_run(
+        agent,
+        build_refresh_prompt(job_description, previous, sections),
+        bypass_cache=bypass_cache,
+        document_type="Resume",
+    )
+    updates = parse_llm_json(response)
+    merged = dict(previous)
+    for key in list(sections) + ["company_name", "role_name"]:
+        if key in updates:
+            merged[key] = updates[key]
+    return json.dumps(merged, indent=2)
+
+
+# Updated generate_document function
+def generate_document(
+    job_description, document_type, agent, bypass_cache=False, reuse_similar=False
+):
+    # reuse_similar returns the resume of a near-duplicate earlier posting
+    if reuse_similar and document_type == "Resume" and not bypass_cache:
+        match = SIMILAR_JOBS.find(job_description)
+        if match:
+            logger.info(
+                f"Reusing the resume of a {match['similarity']:.0%} similar posting"
+            )
+            return match["document"]
+    prompt, prefix = agent_prompt(agent, job_description, document_type)
+    response = cached_run(
+        agent,
+        prompt,
+        bypass_cache=bypass_cache,
+        document_type=document_type,
+        prefix=prefix,
+    )
+    return response
+
+
+# Streaming variant of generate_document; a cached response is yielded whole
+def stream_document(job_description, document_type, agent, bypass_cache=False):
+    prompt, prefix = agent_prompt(agent, job_description, document_type)
+    key = response_cache_key(agent, prompt)
+    if not bypass_cache:
+        cached = RESPONSE_CACHE.get(key)
+        if cached is not None:
+            yield cached.decode("utf-8")
+            return
+    chunks = []
+    for text in agent.run_stream(prompt, document_type=document_type, prefix=prefix):
+        chunks.append(text)
+        yield text
+    response = "".join(chunks)
+    if response:
+        RESPONSE_CACHE.set(key, response.encode("utf-8"))
+
+
+DOCUMENT_TYPES = ["Resume", "Cover Letter", "Email"]
+
+JOB_ANALYSIS_PROMPT = """
+        Job Description: {job_description}
+
+        Extract the facts needed to tailor application documents to this job
+        description as a JSON object with this structure:
+        {{
+            "company_name": "Company name",
+            "role_name": "Role title",
+            "required_skills": ["Skill1", "Skill2", ...],
+            "nice_to_have_skills": ["Skill3", ...],
+            "responsibilities": ["Short phrase", ...up to 6]
+        }}
+
+        Only output valid JSON, no markdown or extra text.
+        """
+
+
+def analyze_job_description(job_description, agent, bypass_cache=False):
+    """Compact, cached analysis (company, role, skills) of one posting."""
+    response = cached_run(
+        agent,
+        JOB_ANALYSIS_PROMPT.format(job_description=job_description),
+        bypass_cache=bypass_cache,
+        document_type="Analysis",
+    )
+    analysis = parse_llm_json(response)
+    if not isinstance(analysis, dict) or not analysis.get("role_name"):
+        raise Exception("Job description analysis did not return a role")
+    return analysis
+
+
+def render_job_analysis(analysis):
+    """The analysis as the short job description text fed to build_prompt."""
+    lines = [
+        f"Company: {analysis.get('company_name', '')}",
+        f"Role: {analysis.get('role_name', '')}",
+        f"Required skills: {', '.join(analysis.get('required_skills', []))}",
+    ]
+    if analysis.get("nice_to_have_skills"):
+        lines.append(
+            f"Nice-to-have skills: {', '.join(analysis['nice_to_have_skills'])}"
+        )
+    if analysis.get("responsibilities"):
+        lines.append("Key responsibilities:")
+        lines.extend(f"- {item}" for item in analysis["responsibilities"])
+    return "\n".join(lines)
+
+
+def generate_all_documents(
+    job_description, agent, document_types=None, bypass_cache=False
+):
+    """
+    Analyzes the posting once, then generates every document type
+    concurrently from that compact analysis instead of the raw posting (the
+    raw posting is used if the analysis fails).
+    Returns: {"analysis", "documents": {type: text}, "errors": {type: message},
+    "timings": {"analysis", type..., "total"}}
+    """
+    document_types = document_types or DOCUMENT_TYPES
+    started = time.perf_counter()
+    try:
+        analysis = analyze_job_description(job_description, agent, bypass_cache)
+        posting = render_job_analysis(analysis)
+    except Exception as e:
+        logger.warning(
+            f"Job description analysis failed, using the raw posting: {str(e)}"
+        )
+        analysis, posting = None, job_description
+    timings = {"analysis": round(time.perf_counter() - started, 3)}
+    # Worker threads do not inherit the caller's call priority
+    priority = getattr(_CALL_CONTEXT, "priority", PRIORITY_INTERACTIVE)
+
+    def _generate(document_type):
+        document_started = time.perf_counter()
+        with call_priority(priority):
+            document = generate_document(posting, document_type, agent, bypass_cache)
+        return document, time.perf_counter() - document_started
+
+    documents, errors = {}, {}
+    with ThreadPoolExecutor(
+        max_workers=len(document_types), thread_name_prefix="generate-all"
+    ) as executor:
+        futures = {
+            executor.submit(_generate, document_type): document_type
+            for document_type in document_types
+        }
+        for future in as_completed(futures):
+            document_type = futures[future]
+            try:
+                documents[document_type], seconds = future.result()
+                timings[document_type] = round(seconds, 3)
+            except Exception as e:
+                logger.error(f"Generating {document_type} failed: {str(e)}")
+                errors[document_type] = str(e)
+    timings["total"] = round(time.perf_counter() - started, 3)
+    if "Resume" in documents:
+        SIMILAR_JOBS.add(job_description, documents["Resume"])
+    return {
+        "analysis": analysis,
+        "documents": documents,
+        "errors": errors,
+        "timings": timings,
+    }
+
+
+# Per-provider latency history and a log of recent races
+class RaceStats:
+    def __init__(self, history, log_size):
+        self._latencies = {}
+        self._history = history
+        self.log = deque(maxlen=log_size)
+        self._lock = threading.Lock()
+
+    def record_latency(self, provider, seconds):
+        with self._lock:
+            self._latencies.setdefault(
+                provider, deque(maxlen=self._history)
+            ).append(seconds)
+
+    def hedge_delay(self, provider):
+        with self._lock:
+            samples = sorted(self._latencies.get(provider, ()))
+        if len(samples) < RACE_CONFIG["min_samples_for_hedge"]:
+            return RACE_CONFIG["default_hedge_delay_seconds"]
+        index = min(
+            len(samples) - 1, int(RACE_CONFIG["hedge_percentile"] * len(samples))
+        )
+        return samples[index]
+
+    def record_race(self, race):
+        with self._lock:
+            self.log.appendleft(race)
+
+
+RACE_STATS = process_singleton(
+    "race_stats",
+    lambda: RaceStats(RACE_CONFIG["latency_history"], RACE_CONFIG["log_size"]),
+)
+
+
+def race_providers(prompt, providers, validate=None, hedge=False, document_type=None):
+    """
+    Sends prompt to each provider concurrently and returns the first response
+    that passes validate (default: non-empty). Losing requests are cancelled
+    by closing their HTTP responses, which also ends reads blocked on them.
+    - hedge=True starts providers[0] alone and only adds the rest once it has
+      been running longer than its recent p95 latency.
+    Returns: {"winner", "response", "timings": {provider: {"seconds", "status"}}}
+    """
+    if not providers:
+        raise Exception("No providers selected for race mode")
+    validate = validate or (lambda response: bool(response.strip()))
+    cancel = threading.Event()
+    results = queue.Queue()
+    started_at = {}
+
+    def _run(provider):
+        started = started_at[provider] = time.perf_counter()
+        chunks = []
+        try:
+            # Each racer sticks to its own provider's models
+            # The winner's cancel.set() also closes this racer's response
+            stream = MODEL_REGISTRY.get(provider).run_stream(
+                prompt,
+                document_type=document_type,
+                cross_provider=False,
+                cancel=cancel,
+            )
+            try:
+                for text in stream:
+                    if cancel.is_set():
+                        break
+                    chunks.append(text)
+            finally:
+                stream.close()
+            if cancel.is_set():
+                results.put((provider, None, "cancelled", None))
+                return
+            response = "".join(chunks)
+            status = "ok" if validate(response) else "invalid"
+            elapsed = time.perf_counter() - started
+            RACE_STATS.record_latency(provider, elapsed)
+            results.put((provider, response, status, elapsed))
+        except Exception as e:
+            logger.error(f"Race request to {provider} failed: {str(e)}")
+            results.put((provider, None, "error", time.perf_counter() - started))
+
+    def _launch(batch):
+        for provider in batch:
+            threading.Thread(
+                target=_run, args=(provider,), name=f"race-{provider}", daemon=True
+            ).start()
+
+    pending = set()
+    if hedge and len(providers) > 1:
+        delay = RACE_STATS.hedge_delay(providers[0])
+        _launch(providers[:1])
+        pending.add(providers[0])
+        waiting = providers[1:]
+    else:
+        delay = None
+        _launch(providers)
+        pending.update(providers)
+        waiting = []
+
+    timings = {}
+    winner, response = None, None
+    while pending or waiting:
+        try:
+            provider, text, status, elapsed = results.get(timeout=delay)
+        except queue.Empty:
+            # The primary is slower than usual: hedge with the others
+            logger.debug(f"Hedging after {delay:.2f}s with {waiting}")
+            _launch(waiting)
+            pending.update(waiting)
+            waiting, delay = [], None
+            continue
+        pending.discard(provider)
+        timings[provider] = {
+            "seconds": round(elapsed, 3) if elapsed is not None else None,
+            "status": status,
+        }
+        if status == "ok":
+            winner, response = provider, text
+            break
+        if not pending and waiting:
+            # Everything launched so far failed; do not keep waiting to hedge
+            _launch(waiting)
+            pending.update(waiting)
+            waiting, delay = [], None
+
+    cancel.set()
+    now = time.perf_counter()
+    for provider in pending:
+        timings[provider] = {
+            "seconds": round(now - started_at.get(provider, now), 3),
+            "status": "cancelled",
+        }
+    for provider in waiting:
+        timings[provider] = {"seconds": None, "status": "not started"}
+    race = {"winner": winner, "timings": timings, "hedged": hedge}
+    RACE_STATS.record_race(race)
+    if winner is None:
+        raise Exception(f"No provider returned a usable response: {timings}")
+    logger.info(f"Race won by {winner}: {timings}")
+    return {"winner": winner, "response": response, "timings": timings}
+
+
+# Race generate_document across providers; the winner's answer is cached
+def race_document(job_description, document_type, providers, hedge=False):
+    prompt = build_prompt(job_description, document_type)
+
+    def _parses(response):
+        if document_type != "Resume":
+            return bool(response.strip())
+        # Only a complete top-level object counts, not a repaired truncation
+        parser = TolerantJSONParser(emit_sections=())
+        parser.feed(response)
+        return parser.done
+
+    race = race_providers(
+        prompt, providers, validate=_parses, hedge=hedge, document_type=document_type
+    )
+    winner_agent = MODEL_REGISTRY.get(race["winner"])
+    RESPONSE_CACHE.set(
+        response_cache_key(winner_agent, prompt), race["response"].encode("utf-8")
+    )
+    return race
+
+
+# Single-pass, incremental parser for the JSON an LLM returns
+class TolerantJSONParser:
+    """
+    Feed text as it arrives; completed items of the sections in emit_sections
+    (e.g. each work_experience entry, each skills category) are returned by
+    feed() as (section, key, value) as soon as they close. finish() returns
+    the whole value, repaired.
+
+    Repairs common LLM faults in the same pass: ``` fences, // comments,
+    prose around the JSON, trailing commas, mismatched closers, and
+    truncation (open strings and containers are closed, dangling keys
+    dropped). Braces and brackets inside strings are never counted.
+    """
+
+    _STRING_SPECIAL = re.compile(r'["\\]')
+    _LITERAL = re.compile(r"[A-Za-z0-9.+\-]+")
+    _ESCAPES = {
+        '"': '"',
+        "\\": "\\",
+        "/": "/",
+        "b": "\b",
+        "f": "\f",
+        "n": "\n",
+        "r": "\r",
+        "t": "\t",
+    }
+    _CONSTANTS = {"true": True, "false": False, "null": None}
+
+    def __init__(self, emit_sections=("work_experience", "projects", "skills")):
+        self.emit_sections = set(emit_sections)
+        self.root = None
+        self.done = False
+        self._buffer = ""
+        # Each frame: [container, path, pending key]
+        self._stack = []
+        self._string = None
+        self._literal = None
+        self._skip_line = False
+        self._line_start = True
+        self._events = []
+
+    def feed(self, text):
+        self._buffer += text
+        self._consume(final=False)
+        events, self._events = self._events, []
+        return events
+
+    def finish(self):
+        self._consume(final=True)
+        if self._string is not None:
+            self._end_string()
+        if self._literal is not None:
+            self._end_literal()
+        while self._stack:
+            self._close()
+        if self.root is None:
+            raise ValueError("No JSON object found in model output")
+        return self.root
+
+    def _consume(self, final):
+        s = self._buffer
+        i, n = 0, len(s)
+        while i < n and not self.done:
+            if self._skip_line:
+                j = s.find("\n", i)
+                if j < 0:
+                    i = n
+                    break
+                self._skip_line = False
+                self._line_start = True
+                i = j + 1
+            elif self._string is not None:
+                m = self._STRING_SPECIAL.search(s, i)
+                if m is None:
+                    self._string.append(s[i:])
+                    i = n
+                    break
+                j = m.start()
+                self._string.append(s[i:j])
+                if s[j] == '"':
+                    i = j + 1
+                    self._end_string()
+                    continue
+                # Backslash escape; wait for the rest if it is split across chunks
+                if j + 1 >= n or (s[j + 1] == "u" and j + 6 > n):
+                    i = j
+                    break
+                escape = s[j + 1]
+                if escape == "u":
+                    try:
+                        self._string.append(chr(int(s[j + 2 : j + 6], 16)))
+                    except ValueError:
+                        self._string.append(s[j + 2 : j + 6])
+                    i = j + 6
+                else:
+                    self._string.append(self._ESCAPES.get(escape, escape))
+                    i = j + 2
+            elif self._literal is not None:
+                m = self._LITERAL.match(s, i)
+                if m:
+                    self._literal += m.group()
+                    i = m.end()
+                if i >= n:
+                    break
+                self._end_literal()
+            else:
+                c = s[i]
+                if c == "\n":
+                    self._line_start = True
+                    i += 1
+                    continue
+                if c in " \t\r":
+                    i += 1
+                    continue
+                if c == "`" and self._line_start:
+                    # Markdown fence line such as ```json
+                    self._skip_line = True
+                    continue
+                self._line_start = False
+                if c == "/":
+                    if i + 1 >= n and not final:
+                        break
+                    if s[i + 1 : i + 2] == "/":
+                        self._skip_line = True
+                    i += 2
+                    continue
+                i += 1
+                if c in "{[":
+                    self._open({} if c == "{" else [])
+                elif not self._stack:
+                    # Prose before the JSON starts
+                    continue
+                elif c in "}]":
+                    self._close(dict if c == "}" else list)
+                elif c == '"':
+                    self._string = []
+                elif c == ",":
+                    # Also makes trailing commas harmless
+                    self._stack[-1][2] = None
+                elif c == ":":
+                    continue
+                elif self._LITERAL.match(c):
+                    self._literal = c
+        self._buffer = s[i:] if not self.done else ""
+
+    def _end_string(self):
+        value = "".join(self._string)
+        self._string = None
+        if any("\ud800" <= ch <= "\udfff" for ch in value):
+            # Re-pair UTF-16 surrogates produced by \uXXXX escapes
+            value = value.encode("utf-16", "surrogatepass").decode("utf-16", "replace")
+        frame = self._stack[-1]
+        if isinstance(frame[0], dict) and frame[2] is None:
+            frame[2] = value
+        else:
+            self._attach(value)
+
+    def _end_literal(self):
+        text, self._literal = self._literal, None
+        if text in self._CONSTANTS:
+            value = self._CONSTANTS[text]
+        else:
+            try:
+                value = int(text)
+            except ValueError:
+                try:
+                    value = float(text)
+                except ValueError:
+                    # Bare words are not valid values; skip them
+                    return
+        self._attach(value)
+
+    def _attach(self, value):
+        """Stores value in the current container; returns its key or index."""
+        container, path, key = self._stack[-1]
+        if isinstance(container, list):
+            container.append(value)
+            key = len(container) - 1
+        elif key is None:
+            return None
+        else:
+            container[key] = value
+            self._stack[-1][2] = None
+        if not isinstance(value, (dict, list)):
+            self._emit(path, key, value)
+        return key
+
+    def _open(self, container):
+        if not self._stack:
+            if self.root is not None:
+                return
+            self.root = container
+            self._stack.append([container, (), None])
+            return
+        key = self._attach(container)
+        if key is None:
+            # An object value without a key; parse it but keep it detached
+            key = ""
+        self._stack.append([container, self._stack[-1][1] + (key,), None])
+
+    def _close(self, kind=None):
+        # A closer with no open container of its kind is stray and skipped.
+        # Otherwise it ends only the innermost container: models mostly get
+        # the bracket type wrong, so [1, 2} must not close the object around it
+        if kind is not None and not any(isinstance(f[0], kind) for f in self._stack):
+            return
+        container, path, _ = self._stack.pop()
+        if path:
+            self._emit(path[:-1], path[-1], container)
+        else:
+            self.done = True
+
+    def _emit(self, parent_path, key, value):
+        if len(parent_path) == 1 and parent_path[0] in self.emit_sections:
+            self._events.append((parent_path[0], key, value))
+
+
+@functools.lru_cache(maxsize=32)
+def parse_llm_json(text):
+    """Parses (and repairs) LLM JSON output. The result is cached per text,
+    so callers must treat it as read-only."""
+    parser = TolerantJSONParser(emit_sections=())
+    parser.feed(text)
+    return parser.finish()
+
+
+# Map edited resume sections onto the {{PLACEHOLDER}} names used in the template
+def build_placeholder_map(work_experience, projects, skills):
+    return {
+        "SKILLS": "\n".join([f"{cat}: {', '.join(skills[cat])}" for cat in skills]),
+        "PROJECTS": "\n".join(
+            [
+                f"{proj.get('name', '')}: {proj.get('description', '')[:-1]} using {', '.join(proj.get('technologies', []))}"
+                for proj in projects
+            ]
+        ),
+        "EXPERIENCE1": (
+            "\n".join(work_experience[0].get("bullets", []))
+            if len(work_experience) > 0
+            else ""
+        ),
+        "EXPERIENCE2": (
+            "\n".join(work_experience[1].get("bullets", []))
+            if len(work_experience) > 1
+            else ""
+        ),
+        "EXPERIENCE3": (
+            "\n".join(work_experience[2].get("bullets", [])).strip()
+            if len(work_experience) > 2
+            else ""
+        ),
+        # Experience headers as edited; blank ones fall back to the portfolio
+        **{
+            f"{field.upper()}{i}": experience[field]
+            for i, experience in enumerate(work_experience[:3], start=1)
+            for field in ("role", "company", "duration")
+            if experience.get(field)
+        },
+    }
+
+
+# Typed view of a generated resume, parsed once per document for the editor
+class ResumeExperience:
+    def __init__(self, role="", company="", duration="", bullets=()):
+        self.role = role
+        self.company = company
+        self.duration = duration
+        self.bullets = tuple(bullets)
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            data.get("role", ""),
+            data.get("company", ""),
+            data.get("duration", ""),
+            data.get("bullets", []),
+        )
+
+
+class ResumeProject:
+    def __init__(self, name="", description="", technologies=()):
+        self.name = name
+        self.description = description
+        self.technologies = tuple(technologies)
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            data.get("name", ""),
+            data.get("description", ""),
+            data.get("technologies", []),
+        )
+
+
+class Resume:
+    def __init__(
+        self, digest, role_name, company_name, work_experience, projects, skills
+    ):
+        self.digest = digest
+        self.role_name = role_name
+        self.company_name = company_name
+        self.work_experience = tuple(work_experience)
+        self.projects = tuple(projects)
+        self.skills = {category: tuple(items) for category, items in skills.items()}
+
+    def edited_sections(self, session_state):
+        """
+        (work_experience, projects, skills) as edited in the resume editor,
+        falling back to the generated values for widgets not rendered yet.
+        """
+        work_experience = []
+        for i, exp in enumerate(self.work_experience):
+            bullets = session_state.get(f"bullets_{i}", "\n".join(exp.bullets))
+            work_experience.append(
+                {
+                    "role": session_state.get(f"role_{i}", exp.role),
+                    "company": session_state.get(f"company_{i}", exp.company),
+                    "duration": session_state.get(f"duration_{i}", exp.duration),
+                    "bullets": [b for b in bullets.split("\n") if b.strip()],
+                }
+            )
+        projects = []
+        for i, proj in enumerate(self.projects):
+            technologies = session_state.get(
+                f"proj_tech_{i}", ", ".join(proj.technologies)
+            )
+            projects.append(
+                {
+                    "name": session_state.get(f"proj_name_{i}", proj.name),
+                    "description": session_state.get(
+                        f"proj_desc_{i}", proj.description
+                    ),
+                    "technologies": [
+                        t.strip() for t in technologies.split(",") if t.strip()
+                    ],
+                }
+            )
+        skills = {}
+        for category, items in self.skills.items():
+            value = session_state.get(f"skills_{category}", ", ".join(items))
+            skills[category] = [s.strip() for s in value.split(",") if s.strip()]
+        return work_experience, projects, skills
+
+
+@functools.lru_cache(maxsize=32)
+def _parse_resume(digest, document):
+    resume_json = parse_llm_json(document)
+    return Resume(
+        digest,
+        resume_json.get("role_name", ""),
+        resume_json.get("company_name", ""),
+        [ResumeExperience.from_json(e) for e in resume_json.get("work_experience", [])],
+        [ResumeProject.from_json(p) for p in resume_json.get("projects", [])],
+        resume_json.get("skills", {}),
+    )
+
+
+def parse_resume(document):
+    """The Resume for an LLM resume document, cached by the document's hash."""
+    digest = hashlib.sha256(document.encode("utf-8")).hexdigest()
+    return _parse_resume(digest, document)
+
+
+# Widget keys of the resume editor, cleared once a PDF has been generated
+RESUME_EDITOR_KEY_PREFIXES = (
+    "role_",
+    "company_",
+    "duration_",
+    "bullets_",
+    "proj_",
+    "skills_",
+    "ach_",
+)
+
+
+def reset_resume_editor_state(session_state):
+    for k in list(session_state.keys()):
+        if k.startswith(RESUME_EDITOR_KEY_PREFIXES):
+            del session_state[k]
+
+
+# Latency percentiles and throughput for a list of per-request durations
+def latency_summary(latencies, elapsed):
+    ordered = sorted(latencies)
+
+    def percentile(p):
+        if not ordered:
+            return None
+        index = min(len(ordered) - 1, max(0, int(round(p * len(ordered))) - 1))
+        return round(ordered[index], 3)
+
+    return {
+        "count": len(ordered),
+        "throughput_per_min": round(len(ordered) / elapsed * 60, 2) if elapsed else 0.0,
+        "p50": percentile(0.50),
+        "p90": percentile(0.90),
+        "p95": percentile(0.95),
+        "p99": percentile(0.99),
+        "max": round(ordered[-1], 3) if ordered else None,
+    }
+
+
+# Batch generation: read job descriptions from JSONL or CSV
+def load_job_descriptions(path, default_document_type="Resume"):
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    jobs = []
+    for line_number, row in enumerate(rows, start=1):
+        job_description = (row.get("job_description") or "").strip()
+        if not job_description:
+            logger.warning(f"Skipping row {line_number} of {path}: no job_description")
+            continue
+        jobs.append(
+            {
+                "id": str(row.get("id") or line_number),
+                "job_description": job_description,
+                "document_type": row.get("document_type") or default_document_type,
+            }
+        )
+    return jobs
 
-        Job Description: {job_description}
 
-        Task: Generate a {document_type} tailored to the job description. Follow these steps:
-        1. Analyze the job description to identify key skills, technologies, and responsibilities.
-        2. Match my skills, experiences, projects, and achievements to the job requirements.
-        3. Perform a web search to gather additional context about the company or role.
-        4. Structure the {document_type} to highlight relevant qualifications and achievements.
-        5. Use a professional tone and ensure the content is concise and impactful.
-        6. Keep it short length and use simple words and sentences.
-        7. It must sound like a human and should not sound even a bit like an AI generated.
-        8. Figure out the comapny's name from the job description and use it in the {document_type} wherever applicable.
-        9. Use the web search results to get more details about the company to use them in the {document_type}.
-        10. The length of the {document_type} should be 2-3 paragraphs with minimal and impressive content.
-        11. Dont keep it generic. Write it according to me, the role and the company.
-        12. Make it sound naturally human written.
-        13. For a requirement in the job description which is not present in my skills or experiences mention find and mention relevant ones from my skill and say that I am a fast learner with a great grasping power and I can learn it easily.
-        14. Mention that I was the co-founder of a startup and maintained it for 4 years while completing my bachelors and masters and that managerial and leadership skills will add a great value.
+def run_batch(
+    input_path,
+    output_path,
+    provider,
+    document_type="Resume",
+    concurrency=4,
+    pdf_dir=None,
+    template_doc_id=None,
+    bypass_cache=False,
+    pdf_backend=None,
+    reuse_similar=False,
+):
+    """
+    Generates a document per job description with at most `concurrency`
+    requests in flight. Each result is appended to output_path (JSONL) as soon
+    as it completes, so a rerun after a crash skips the rows already done.
+    """
+    if not os.path.exists(DATA_FILE):
+        save_personal_data()
+    jobs = load_job_descriptions(input_path, document_type)
+    done = set()
+    if os.path.exists(output_path):
+        with open(output_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A crash can leave a partially written last line
+                    continue
+                if record.get("status") == "ok":
+                    done.add((record["id"], record["document_type"]))
+    pending = [job for job in jobs if (job["id"], job["document_type"]) not in done]
+    print(f"{len(jobs)} job descriptions, {len(jobs) - len(pending)} already done")
+    pdf_backend = pdf_backend or PDF_EXPORT_CONFIG["backend"]
+    if pdf_backend == "local" and not template_doc_id:
+        template_doc_id = PDF_EXPORT_CONFIG["local_template"]
+    if pdf_dir:
+        os.makedirs(pdf_dir, exist_ok=True)
 
-        Provide the {document_type} below:
-        """
+    agent = MODEL_REGISTRY.get(provider)
+    write_lock = threading.Lock()
+    latencies = []
+
+    def _process(job):
+        started = time.perf_counter()
+        record = {"id": job["id"], "document_type": job["document_type"]}
+        try:
+            # Batch calls queue behind interactive UI requests
+            with call_priority(PRIORITY_BACKGROUND):
+                document = generate_document(
+                    job["job_description"],
+                    job["document_type"],
+                    agent,
+                    bypass_cache,
+                    reuse_similar=reuse_similar,
+                )
+            record.update(status="ok", document=document)
+            if job["document_type"] == "Resume":
+                SIMILAR_JOBS.add(job["job_description"], document)
+            if pdf_dir and template_doc_id and job["document_type"] == "Resume":
+                resume_json = parse_llm_json(document)
+                pdf_bytes = export_resume_pdf(
+                    template_doc_id,
+                    build_placeholder_map(
+                        resume_json.get("work_experience", []),
+                        resume_json.get("projects", []),
+                        resume_json.get("skills", {}),
+                    ),
+                    backend=pdf_backend,
+                    bypass_cache=bypass_cache,
+                )
+                pdf_path = os.path.join(pdf_dir, f"{job['id']}.pdf")
+                with open(pdf_path, "wb") as f:
+                    f.write(pdf_bytes)
+                record["pdf"] = pdf_path
+        except Exception as e:
+            logger.error(f"Batch item {job['id']} failed: {str(e)}")
+            record.update(status="error", error=str(e))
+        record["latency"] = round(time.perf_counter() - started, 3)
+        return record
+
+    started = time.perf_counter()
+    failures = 0
+    with open(output_path, "a", encoding="utf-8") as out, ThreadPoolExecutor(
+        max_workers=concurrency
+    ) as pool:
+        for future in as_completed([pool.submit(_process, job) for job in pending]):
+            record = future.result()
+            with write_lock:
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                os.fsync(out.fileno())
+            if record["status"] == "ok":
+                latencies.append(record["latency"])
+            else:
+                failures += 1
+            print(f"[{record['status']}] {record['id']} in {record['latency']:.2f}s")
+    summary = latency_summary(latencies, time.perf_counter() - started)
+    summary["failures"] = failures
+    return summary
+
+
+def run_load_test(
+    provider,
+    job_description,
+    requests=50,
+    concurrency=8,
+    document_type="Resume",
+    stream=False,
+    unique=True,
+    bypass_cache=False,
+):
+    """
+    Drives generate_document (or stream_document) end to end with
+    `concurrency` requests in flight and summarizes latency, throughput and
+    failures. With unique, every request gets its own job description so the
+    response cache never answers; without it, all but the first are hits.
+    """
+    if not os.path.exists(DATA_FILE):
+        save_personal_data()
+    agent = MODEL_REGISTRY.get(provider)
+    errors = Counter()
+    first_token = []
+
+    def _one(index):
+        text = job_description
+        if unique:
+            text = f"{job_description}\n\nPosting reference: load-{index}-{time.time_ns()}"
+        started = time.perf_counter()
+        try:
+            if stream:
+                chunks = []
+                for chunk in stream_document(text, document_type, agent, bypass_cache):
+                    if not chunks:
+                        first_token.append(time.perf_counter() - started)
+                    chunks.append(chunk)
+                document = "".join(chunks)
+            else:
+                document = generate_document(text, document_type, agent, bypass_cache)
+            if document_type == "Resume":
+                parse_llm_json(document)
+        except Exception as e:
+            errors[str(e)[:120]] += 1
+            return None
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = [
+            latency for latency in pool.map(_one, range(requests)) if latency is not None
+        ]
+    summary = latency_summary(latencies, time.perf_counter() - started)
+    summary["concurrency"] = concurrency
+    summary["failures"] = sum(errors.values())
+    summary["errors"] = dict(errors.most_common(5))
+    if stream:
+        summary["ttft"] = latency_summary(first_token, time.perf_counter() - started)
+    summary["rate_limits"] = [
+        row for row in RATE_LIMITER.stats() if row["provider"] == provider
+    ]
+    summary["health"] = HEALTH_ROUTER.snapshot()
+    return summary
+
+
+def st_fragment(fn):
+    """
+    st.fragment, applied when fn is called so that defining the editor
+    sections does not import streamlit. Editing a widget inside a fragment
+    reruns only that fragment; the edits live in st.session_state.
+    """
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        return st.fragment(fn)(*args, **kwargs)
+
+    return run
+
+
+@st_fragment
+def render_experience_editor(i, exp):
+    with st.expander(f"Experience {i+1}: {exp.role} at {exp.company}"):
+        st.text_input("Role", exp.role, key=f"role_{i}")
+        st.text_input("Company", exp.company, key=f"company_{i}")
+        st.text_input("Duration", exp.duration, key=f"duration_{i}")
+        st.text_area(
+            "Bullets (one per line)",
+            "\n".join(exp.bullets),
+            height=120,
+            key=f"bullets_{i}",
+        )
 
-    response = agent.run_sync(prompt)
-    return response
+
+@st_fragment
+def render_project_editor(i, proj):
+    with st.expander(f"Project {i+1}: {proj.name}"):
+        st.text_input("Name", proj.name, key=f"proj_name_{i}")
+        st.text_area("Description", proj.description, height=80, key=f"proj_desc_{i}")
+        st.text_input(
+            "Technologies (comma separated)",
+            ", ".join(proj.technologies),
+            key=f"proj_tech_{i}",
+        )
+
+
+@st_fragment
+def render_skills_editor(skills):
+    for cat, skill_list in skills.items():
+        st.text_input(
+            f"{cat} Skills (comma separated)",
+            ", ".join(skill_list),
+            key=f"skills_{cat}",
+        )
 
 
 # Streamlit UI
 def main():
     st.title("Personalized Resume & Cover Letter Generator")
 
+    with st.sidebar.expander("Startup"):
+        st.caption(f"Cold-start budget: {STARTUP_BUDGET_MS} ms")
+        st.table(
+            [
+                {"module": name, "import_ms": round(seconds * 1000, 1)}
+                for name, seconds in IMPORT_TIMES.items()
+            ]
+        )
+
     if not os.path.exists(DATA_FILE):
         st.info("Saving json file with your data...")
         save_personal_data()
@@ -723,57 +4256,275 @@ def main():
             index=enabled_models.index(st.session_state["selected_model"]),
         )
         st.session_state["selected_model"] = selected_model
-        agent = LLMModel(MODEL_CONFIG[selected_model])
+        # Hold one registry lease per browser session for its current model,
+        # renewed on every rerun so it lapses once the session goes away
+        lease_id = st.session_state.setdefault("registry_lease", uuid.uuid4().hex)
+        leased_model = st.session_state.get("leased_model")
+        agent = MODEL_REGISTRY.acquire(selected_model, lease_id)
+        if leased_model and leased_model != selected_model:
+            MODEL_REGISTRY.release(leased_model, lease_id)
+        st.session_state["leased_model"] = selected_model
     except Exception as e:
         st.error(str(e))
         return
 
     job_description = st.text_area("Paste the Job Description", height=200)
-    document_type = st.selectbox(
-        "Select Document Type", ["Resume", "Cover Letter", "Email"]
+    document_type = st.selectbox("Select Document Type", DOCUMENT_TYPES)
+
+    bypass_cache = st.sidebar.checkbox(
+        "Bypass response cache",
+        value=False,
+        help="Always call the model (and re-export PDFs) and overwrite any cached result.",
+    )
+    cache_stats = RESPONSE_CACHE.stats()
+    st.sidebar.caption(
+        f"Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses"
+    )
+    pdf_cache_stats = PDF_CACHE.stats()
+    st.sidebar.caption(
+        f"PDF cache: {pdf_cache_stats['hits']} hits, {pdf_cache_stats['misses']} misses"
+    )
+
+    with st.sidebar.expander("HTTP connections"):
+        st.table(
+            [
+                {"provider": provider, **stats}
+                for provider, stats in HTTP_SESSIONS.stats().items()
+            ]
+        )
+
+    with st.sidebar.expander("Rate limits"):
+        st.table(RATE_LIMITER.stats())
+
+    with st.sidebar.expander("Model health"):
+        health = HEALTH_ROUTER.snapshot()
+        if health:
+            st.table(health)
+        else:
+            st.caption("No API calls yet.")
+
+    race_mode = st.sidebar.checkbox(
+        "Race providers",
+        value=False,
+        help="Send the request to several providers and keep the first usable answer.",
     )
+    if race_mode:
+        # Local models are opt-in: racing one would load its weights
+        race_with = st.sidebar.multiselect(
+            "Providers to race",
+            enabled_models,
+            default=[
+                name
+                for name in enabled_models
+                if MODEL_CONFIG[name].get("base_url") is not None
+            ],
+        )
+        hedge = st.sidebar.checkbox(
+            "Hedge instead of racing immediately",
+            value=False,
+            help="Start the first provider alone; add the others only once it is slower than its recent p95.",
+        )
+    with st.sidebar.expander("Recent races"):
+        for race in list(RACE_STATS.log):
+            st.caption(f"Winner: {race['winner'] or 'none'}")
+            st.table(
+                [{"provider": provider, **timing} for provider, timing in race["timings"].items()]
+            )
+
+    with st.sidebar.expander("Usage & cost"):
+        ledger_summary = LEDGER.summary()
+        st.markdown("**Per day**")
+        st.table(ledger_summary["daily"])
+        st.markdown("**Per document type**")
+        st.table(ledger_summary["by_document_type"])
 
     if "generated_document" not in st.session_state:
         st.session_state["generated_document"] = None
-    if st.button("Generate Document"):
+    generate_column, generate_all_column = st.columns(2)
+    with generate_column:
+        generate_clicked = st.button("Generate Document")
+    with generate_all_column:
+        generate_all_clicked = st.button(
+            "Generate All",
+            help="Analyze the posting once, then write every document type in parallel.",
+        )
+    if generate_all_clicked:
         if job_description:
-            with st.spinner(f"Generating {document_type}..."):
-                try:
-                    document = generate_document(job_description, document_type, agent)
-                    st.session_state["generated_document"] = document
-                except Exception as e:
-                    st.error(f"Error generating document: {str(e)}")
-                    st.session_state["generated_document"] = None
+            with st.spinner(f"Generating {', '.join(DOCUMENT_TYPES)}..."):
+                result = generate_all_documents(
+                    job_description, agent, bypass_cache=bypass_cache
+                )
+            for failed_type, message in result["errors"].items():
+                st.error(f"Error generating {failed_type}: {message}")
+            st.session_state["generated_documents"] = result
+            st.session_state["generation_timing"] = None
+        else:
+            st.error("Please provide a job description.")
+    # Set by "Generate from scratch" when a near-duplicate posting was found
+    force_generate = st.session_state.pop("force_generate", False)
+    if generate_clicked or force_generate:
+        # A single generation replaces the results of Generate All
+        st.session_state["generated_documents"] = None
+        similar = None
+        if job_description and document_type == "Resume" and not race_mode:
+            if not (bypass_cache or force_generate):
+                similar = SIMILAR_JOBS.find(job_description)
+        st.session_state["similar_resume"] = similar and {
+            **similar,
+            "for_job_description": job_description,
+        }
+        if similar:
+            # Offered below instead of calling the model
+            st.session_state["generated_document"] = None
+        elif job_description:
+            started = time.perf_counter()
+            first_token_at = None
+            try:
+                if race_mode:
+                    with st.spinner(f"Racing {', '.join(race_with)}..."):
+                        race = race_document(
+                            job_description, document_type, race_with, hedge=hedge
+                        )
+                    document = race["response"]
+                    st.caption(
+                        f"Winner: {race['winner']} in "
+                        f"{race['timings'][race['winner']]['seconds']:.2f}s"
+                    )
+                elif document_type == "Resume":
+                    # List each resume section as soon as its JSON closes
+                    live_output = st.empty()
+                    parser = TolerantJSONParser()
+                    chunks, completed = [], []
+                    for text in stream_document(
+                        job_description, document_type, agent, bypass_cache
+                    ):
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        chunks.append(text)
+                        for section, key, value in parser.feed(text):
+                            if section == "skills":
+                                completed.append(f"Skills: {key}")
+                            elif not isinstance(value, dict):
+                                continue
+                            elif section == "work_experience":
+                                completed.append(
+                                    f"Experience: {value.get('role', '')} at {value.get('company', '')}"
+                                )
+                            else:
+                                completed.append(f"Project: {value.get('name', '')}")
+                            live_output.markdown(
+                                "\n".join(f"- {line}" for line in completed)
+                            )
+                    live_output.empty()
+                    document = "".join(chunks)
+                else:
+                    # Cover Letter and Email render progressively as tokens arrive
+                    live_output = st.empty()
+                    chunks = []
+                    for text in stream_document(
+                        job_description, document_type, agent, bypass_cache
+                    ):
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        chunks.append(text)
+                        live_output.markdown("".join(chunks))
+                    live_output.empty()
+                    document = "".join(chunks)
+                st.session_state["generated_document"] = document
+                if document_type == "Resume":
+                    SIMILAR_JOBS.add(job_description, document)
+                st.session_state["generation_timing"] = {
+                    "ttft": (
+                        first_token_at - started if first_token_at is not None else None
+                    ),
+                    "total": time.perf_counter() - started,
+                }
+            except Exception as e:
+                st.error(f"Error generating document: {str(e)}")
+                st.session_state["generated_document"] = None
         else:
             st.error("Please provide a job description.")
             st.session_state["generated_document"] = None
 
+    similar = st.session_state.get("similar_resume")
+    if similar and similar["for_job_description"] == job_description:
+        st.info(
+            f"This posting is {similar['similarity']:.0%} similar to one you "
+            f"generated a resume for on {similar['created'][:10]}. Reuse that "
+            "resume, refresh some of its sections, or generate a new one."
+        )
+        refresh_sections = st.multiselect(
+            "Sections to refresh",
+            RESUME_SECTIONS,
+            default=["skills"],
+            key="similar_refresh_sections",
+        )
+        reuse_column, refresh_column, scratch_column = st.columns(3)
+        if reuse_column.button("Use previous resume"):
+            st.session_state["generated_document"] = similar["document"]
+            st.session_state["generation_timing"] = None
+            st.session_state["similar_resume"] = None
+            st.rerun()
+        if refresh_column.button("Refresh sections", disabled=not refresh_sections):
+            started = time.perf_counter()
+            try:
+                with st.spinner(f"Refreshing {', '.join(refresh_sections)}..."):
+                    document = refresh_resume_sections(
+                        job_description,
+                        similar["document"],
+                        refresh_sections,
+                        agent,
+                        bypass_cache,
+                    )
+                SIMILAR_JOBS.add(job_description, document)
+                st.session_state["generated_document"] = document
+                st.session_state["generation_timing"] = {
+                    "ttft": None,
+                    "total": time.perf_counter() - started,
+                }
+                st.session_state["similar_resume"] = None
+                st.rerun()
+            except Exception as e:
+                st.error(f"Error refreshing resume: {str(e)}")
+        if scratch_column.button("Generate from scratch"):
+            st.session_state["similar_resume"] = None
+            st.session_state["force_generate"] = True
+            st.rerun()
+
+    generated_all = st.session_state.get("generated_documents")
+    if generated_all:
+        analysis = generated_all["analysis"]
+        if analysis:
+            with st.expander("Job description analysis"):
+                st.json(analysis)
+        timings = generated_all["timings"]
+        st.caption(
+            " · ".join(f"{name}: {seconds:.2f}s" for name, seconds in timings.items())
+            + " — switch Document Type to see the other documents."
+        )
+        st.session_state["generated_document"] = generated_all["documents"].get(
+            document_type
+        )
+
     document = st.session_state["generated_document"]
     if document:
         st.subheader(f"Generated {document_type}")
+        timing = st.session_state.get("generation_timing")
+        if timing:
+            if timing["ttft"] is not None:
+                st.caption(
+                    f"Time to first token: {timing['ttft']:.2f}s · "
+                    f"total: {timing['total']:.2f}s"
+                )
+            else:
+                st.caption(f"Total latency: {timing['total']:.2f}s")
         if document_type == "Resume":
             try:
-                # Preprocess: Remove code block markers, lines starting with //, and trailing commas
-                def clean_json_string(s):
-                    s = re.sub(r"^\s*```[a-zA-Z]*", "", s, flags=re.MULTILINE)
-                    s = re.sub(r"^\s*```", "", s, flags=re.MULTILINE)
-                    s = re.sub(r"^\s*//.*$", "", s, flags=re.MULTILINE)
-                    s = re.sub(r",(\s*[}}\]])", r"\1", s)
-                    open_braces = s.count("{")
-                    close_braces = s.count("}")
-                    if open_braces > close_braces:
-                        s += "}" * (open_braces - close_braces)
-                    open_brackets = s.count("[")
-                    close_brackets = s.count("]")
-                    if open_brackets > close_brackets:
-                        s += "]" * (open_brackets - close_brackets)
-                    return s.strip()
-
-                cleaned_doc = clean_json_string(document)
-                resume_json = json.loads(cleaned_doc)
-                # Set global role_name and company_name from model output if present
-                role_name = resume_json.get("role_name", "")
-                company_name = resume_json.get("company_name", "")
+                # Parsed once per document; each section below is a fragment,
+                # so editing one reruns only that section
+                resume = parse_resume(document)
+                role_name = resume.role_name
+                company_name = resume.company_name
                 # Display role_name and company_name as editable text boxes
                 role_name_box = st.text_input(
                     "Role Name (extracted)", role_name, key="role_name_box"
@@ -782,89 +4533,50 @@ def main():
                     "Company Name (extracted)", company_name, key="company_name_box"
                 )
                 # Editable fields
-                work_experience = []
-                for i, exp in enumerate(resume_json.get("work_experience", [])):
-                    with st.expander(
-                        f"Experience {i+1}: {exp.get('role', '')} at {exp.get('company', '')}"
-                    ):
-                        role = st.text_input(
-                            "Role", exp.get("role", ""), key=f"role_{i}"
-                        )
-                        company = st.text_input(
-                            "Company", exp.get("company", ""), key=f"company_{i}"
-                        )
-                        duration = st.text_input(
-                            "Duration", exp.get("duration", ""), key=f"duration_{i}"
-                        )
-                        bullets = st.text_area(
-                            "Bullets (one per line)",
-                            "\n".join(exp.get("bullets", [])),
-                            height=120,
-                            key=f"bullets_{i}",
-                        )
-                        work_experience.append(
-                            {
-                                "role": role,
-                                "company": company,
-                                "duration": duration,
-                                "bullets": [
-                                    b for b in bullets.split("\n") if b.strip()
-                                ],
-                            }
-                        )
+                for i, exp in enumerate(resume.work_experience):
+                    render_experience_editor(i, exp)
                 st.markdown("**Projects**")
-                projects = []
-                for i, proj in enumerate(resume_json.get("projects", [])):
-                    with st.expander(f"Project {i+1}: {proj.get('name', '')}"):
-                        name = st.text_input(
-                            "Name", proj.get("name", ""), key=f"proj_name_{i}"
-                        )
-                        description = st.text_area(
-                            "Description",
-                            proj.get("description", ""),
-                            height=80,
-                            key=f"proj_desc_{i}",
-                        )
-                        technologies = st.text_input(
-                            "Technologies (comma separated)",
-                            ", ".join(proj.get("technologies", [])),
-                            key=f"proj_tech_{i}",
-                        )
-                        projects.append(
-                            {
-                                "name": name,
-                                "description": description,
-                                "technologies": [
-                                    t.strip()
-                                    for t in technologies.split(",")
-                                    if t.strip()
-                                ],
-                            }
-                        )
+                for i, proj in enumerate(resume.projects):
+                    render_project_editor(i, proj)
                 st.markdown("**Skills**")
-                skills = {}
-                for cat, skill_list in resume_json.get("skills", {}).items():
-                    val = st.text_input(
-                        f"{cat} Skills (comma separated)",
-                        ", ".join(skill_list),
-                        key=f"skills_{cat}",
-                    )
-                    skills[cat] = [s.strip() for s in val.split(",") if s.strip()]
-                # Download updated JSON and replace placeholders in Google Doc
-                updated_json = {
-                    "work_experience": work_experience,
-                    "projects": projects,
-                    "skills": skills,
-                }
-                file_name = f"{document_type.lower()}_{uuid.uuid4()}.json"
+                render_skills_editor(resume.skills)
                 # Google Docs integration for Resume
                 st.markdown("---")
-                st.markdown("### Google Docs Resume Export")
-                doc_id_input = st.text_input(
-                    "Google Doc Template ID (for Resume export)",
-                    value="17jbwEwv7GknVg9Q1JnYnpli8aYr9GTOblGZgSbt_jcA",
-                    key="resume_doc_id",
+                st.markdown("### Resume PDF Export")
+                pdf_backend = st.radio(
+                    "PDF backend",
+                    list(PDF_BACKENDS),
+                    index=list(PDF_BACKENDS).index(PDF_EXPORT_CONFIG["backend"]),
+                    format_func=PDF_BACKEND_LABELS.get,
+                    horizontal=True,
+                    key="resume_pdf_backend",
                 )
+                if pdf_backend == "google":
+                    doc_id_input = st.text_input(
+                        "Google Doc Template ID (for Resume export)",
+                        value="17jbwEwv7GknVg9Q1JnYnpli8aYr9GTOblGZgSbt_jcA",
+                        key="resume_doc_id",
+                    )
+                    primed = st.session_state.setdefault("primed_templates", set())
+                    if (
+                        doc_id_input
+                        and TEMPLATE_POOL_CONFIG["enabled"]
+                        and doc_id_input not in primed
+                    ):
+                        # Copies are made while the user edits the resume, once
+                        # per template per session and only with credentials
+                        primed.add(doc_id_input)
+                        if google_export_available():
+                            TEMPLATE_POOL.start_sweeper(
+                                TEMPLATE_POOL_CONFIG["sweep_interval_seconds"]
+                            )
+                            TEMPLATE_POOL.prime(doc_id_input)
+                else:
+                    doc_id_input = st.text_input(
+                        "HTML template path",
+                        value=PDF_EXPORT_CONFIG["local_template"],
+                        key="resume_template_path",
+                    )
                 font_family = st.text_input(
                     "Font Family", "Arial", key="resume_font_family"
                 )
@@ -876,45 +4588,23 @@ def main():
                     key="resume_font_size",
                 )
                 bold = st.checkbox("Bold", value=False, key="resume_bold")
-                # Define placeholder_map here
-                placeholder_map = {
-                    "SKILLS": "\n".join(
-                        [f"{cat}: {', '.join(skills[cat])}" for cat in skills]
-                    ),
-                    "PROJECTS": "\n".join(
-                        [
-                            f"{proj.get('name', '')}: {proj.get('description', '')[:-1]} using {', '.join(proj.get('technologies', []))}"
-                            for proj in projects
-                        ]
-                    ),
-                    "EXPERIENCE1": (
-                        "\n".join(work_experience[0]["bullets"])
-                        if len(work_experience) > 0
-                        else ""
-                    ),
-                    "EXPERIENCE2": (
-                        "\n".join(work_experience[1]["bullets"])
-                        if len(work_experience) > 1
-                        else ""
-                    ),
-                    "EXPERIENCE3": (
-                        "\n".join(work_experience[2]["bullets"]).strip()
-                        if len(work_experience) > 2
-                        else ""
-                    ),
-                }
                 if st.button("Generate PDF", key="resume_download_btn"):
                     if doc_id_input:
                         try:
-                            pdf_bytes = generate_and_download_resume_pdf_via_duplicate(
-                                doc_id_input,  # This is the template doc id
+                            placeholder_map = build_placeholder_map(
+                                *resume.edited_sections(st.session_state)
+                            )
+                            pdf_bytes = export_resume_pdf(
+                                doc_id_input,  # Template doc id or HTML template path
                                 placeholder_map,
                                 font_family,
                                 font_size,
                                 bold,
+                                backend=pdf_backend,
+                                bypass_cache=bypass_cache,
                             )
                             st.success(
-                                "Resume PDF generated from a duplicate of your template! Download will start below."
+                                "Resume PDF generated from your template! Download will start below."
                             )
                             st.download_button(
                                 label="Download Resume PDF",
@@ -923,21 +4613,11 @@ def main():
                                 mime="application/pdf",
                             )
                             # Reset session state for next resume
-                            for k in list(st.session_state.keys()):
-                                if (
-                                    k.startswith("role_")
-                                    or k.startswith("company_")
-                                    or k.startswith("duration_")
-                                    or k.startswith("bullets_")
-                                    or k.startswith("proj_")
-                                    or k.startswith("skills_")
-                                    or k.startswith("ach_")
-                                ):
-                                    del st.session_state[k]
+                            reset_resume_editor_state(st.session_state)
                         except Exception as e:
                             st.error(f"Failed to generate/download PDF: {str(e)}")
                     else:
-                        st.error("Please provide a Google Doc Template ID.")
+                        st.error("Please provide a template.")
             except Exception as e:
                 st.error(f"Could not parse or display JSON: {str(e)}")
                 st.markdown("**Raw Output:**")
@@ -964,63 +4644,519 @@ def generate_and_download_resume_pdf_via_duplicate(
     template_doc_id, placeholder_map, font_family="Arial", font_size=11, bold=False
 ):
     """
-    1. Duplicates the Google Doc (template_doc_id) using Drive API.
+    1. Takes a duplicate of the Google Doc (template_doc_id) from the template pool.
     2. Replaces placeholders in the duplicate using Docs API.
     3. Downloads the duplicate as PDF.
-    4. Deletes the duplicate.
-    Returns: (pdf_bytes, duplicate_doc_id)
+    4. Queues the duplicate for deletion in the background.
+    Returns: pdf_bytes
     """
-    import io
-    import time
-    from googleapiclient.discovery import build
-    from googleapiclient.http import MediaIoBaseDownload
-
-    SCOPES = [
-        "https://www.googleapis.com/auth/documents",
-        "https://www.googleapis.com/auth/drive",
-    ]
-    creds = get_google_creds(SCOPES)
-    docs_service = build("docs", "v1", credentials=creds)
-    drive_service = build("drive", "v3", credentials=creds)
+    docs_service = GOOGLE_CLIENTS.service("docs", "v1", GOOGLE_EXPORT_SCOPES)
+    drive_service = GOOGLE_CLIENTS.service("drive", "v3", GOOGLE_EXPORT_SCOPES)
     # 1. Duplicate the doc
-    copied_file = (
-        drive_service.files()
-        .copy(
-            fileId=template_doc_id, body={"name": f"Resume Export {int(time.time())}"}
+    if TEMPLATE_POOL_CONFIG["enabled"]:
+        TEMPLATE_POOL.start_sweeper(TEMPLATE_POOL_CONFIG["sweep_interval_seconds"])
+        duplicate_doc_id = TEMPLATE_POOL.take(template_doc_id)
+    else:
+        copied_file = (
+            drive_service.files()
+            .copy(
+                fileId=template_doc_id,
+                body={"name": f"{TEMPLATE_POOL_CONFIG['name_prefix']} {int(time.time())}"},
+            )
+            .execute()
         )
-        .execute()
-    )
-    duplicate_doc_id = copied_file["id"]
-    # 2. Replace placeholders in the duplicate
-    requests = []
-    for ph, val in placeholder_map.items():
-        requests.append(
-            {
-                "replaceAllText": {
-                    "containsText": {"text": f"{{{{{ph}}}}}", "matchCase": True},
-                    "replaceText": val,
+        duplicate_doc_id = copied_file["id"]
+    try:
+        # 2. Replace placeholders in the duplicate
+        requests = []
+        for ph, val in placeholder_map.items():
+            requests.append(
+                {
+                    "replaceAllText": {
+                        "containsText": {"text": f"{{{{{ph}}}}}", "matchCase": True},
+                        "replaceText": val,
+                    }
                 }
-            }
+            )
+        if requests:
+            docs_service.documents().batchUpdate(
+                documentId=duplicate_doc_id, body={"requests": requests}
+            ).execute()
+        # 3. Download as PDF
+        request = drive_service.files().export_media(
+            fileId=duplicate_doc_id, mimeType="application/pdf"
+        )
+        fh = io.BytesIO()
+        downloader = google_http.MediaIoBaseDownload(fh, request)
+        done = False
+        while not done:
+            status, done = downloader.next_chunk()
+        fh.seek(0)
+        pdf_bytes = fh.read()
+    finally:
+        # 4. Delete the duplicate
+        if TEMPLATE_POOL_CONFIG["enabled"]:
+            TEMPLATE_POOL.release(duplicate_doc_id)
+        else:
+            drive_service.files().delete(fileId=duplicate_doc_id).execute()
+    return pdf_bytes
+
+
+# Local PDF backend: the same placeholders filled into an HTML template
+_TEMPLATE_PLACEHOLDER = re.compile(r"\{\{(\w+)(?::(list))?\}\}")
+
+# Typographic characters the Latin-1 core fonts cannot encode
+_LATIN1_REPLACEMENTS = str.maketrans(
+    {
+        "\u2013": "-",
+        "\u2014": "-",
+        "\u2018": "'",
+        "\u2019": "'",
+        "\u201c": '"',
+        "\u201d": '"',
+        "\u2022": "-",
+        "\u2026": "...",
+    }
+)
+
+
+@functools.lru_cache(maxsize=8)
+def _parsed_html_template(path, mtime):
+    with open(path, encoding="utf-8") as f:
+        source = f.read()
+    segments = []
+    position = 0
+    for match in _TEMPLATE_PLACEHOLDER.finditer(source):
+        segments.append(source[position : match.start()])
+        segments.append((match.group(1), match.group(2)))
+        position = match.end()
+    segments.append(source[position:])
+    return tuple(segments)
+
+
+def load_html_template(path):
+    """
+    Returns the template as literal strings and (placeholder, format) pairs.
+    Parsed once per file version; `{{NAME:list}}` renders lines as <li> items.
+    """
+    return _parsed_html_template(path, os.path.getmtime(path))
+
+
+def _to_latin1(text):
+    text = text.translate(_LATIN1_REPLACEMENTS)
+    if all(ord(ch) < 256 for ch in text):
+        return text
+    return "".join(
+        ch
+        if ord(ch) < 256
+        else unicodedata.normalize("NFKD", ch).encode("latin-1", "ignore").decode("latin-1")
+        or "?"
+        for ch in text
+    )
+
+
+def _resolve_pdf_font(font_family):
+    """Returns (fpdf family, TrueType path or None) for a UI font name."""
+    ttf_path = PDF_EXPORT_CONFIG["ttf_fonts"].get(font_family)
+    if ttf_path:
+        return font_family.lower(), ttf_path
+    family = PDF_EXPORT_CONFIG["core_fonts"].get(font_family.strip().lower())
+    if family is None:
+        logger.debug(f"No PDF font for {font_family}, using helvetica")
+        family = "helvetica"
+    return family, None
+
+
+def resume_profile_placeholders(data):
+    """Placeholders for the static resume parts the Google Doc template hard-codes."""
+    profile = data.get("profile", {})
+    values = {
+        "NAME": profile.get("name", ""),
+        "EMAIL": profile.get("email", ""),
+        "PHONE": profile.get("phone", ""),
+        "LINKEDIN": profile.get("linkedin", ""),
+        "SUMMARY": profile.get("summary", ""),
+    }
+    for i, experience in enumerate(data.get("experiences", [])[:3], start=1):
+        values[f"ROLE{i}"] = experience.get("role", "")
+        values[f"COMPANY{i}"] = experience.get("company", "")
+        values[f"DURATION{i}"] = experience.get("duration", "")
+    return values
+
+
+def render_resume_pdf_locally(
+    template_path, placeholder_map, font_family="Arial", font_size=11, bold=False
+):
+    """Renders the resume PDF in-process from an HTML template. Returns pdf_bytes."""
+    template_path = template_path or PDF_EXPORT_CONFIG["local_template"]
+    # Headers edited in the resume editor (in placeholder_map) win over the
+    # portfolio's; the portfolio is read through the store so saved edits show
+    values = {
+        **resume_profile_placeholders(PORTFOLIO_STORE.load().data),
+        **placeholder_map,
+    }
+    family, ttf_path = _resolve_pdf_font(font_family)
+    parts = []
+    for segment in load_html_template(template_path):
+        if isinstance(segment, str):
+            parts.append(segment)
+            continue
+        name, fmt = segment
+        value = values.get(name, "")
+        if ttf_path is None:
+            value = _to_latin1(value)
+        lines = [html.escape(line.strip()) for line in value.split("\n") if line.strip()]
+        if fmt == "list":
+            parts.append("".join(f"<li>{line}</li>" for line in lines))
+        else:
+            parts.append("<br>".join(lines))
+    body = "".join(parts)
+    if bold:
+        body = f"<b>{body}</b>"
+
+    pdf = fpdf.FPDF(format="letter")
+    pdf.set_margins(15, 12, 15)
+    if ttf_path:
+        for style in ("", "B", "I", "BI"):
+            pdf.add_font(family, style, ttf_path)
+    pdf.add_page()
+    pdf.set_font(family, size=font_size)
+    pdf.write_html(body, font_family=family, li_prefix_color=(0, 0, 0))
+    return bytes(pdf.output())
+
+
+PDF_BACKENDS = {
+    "google": generate_and_download_resume_pdf_via_duplicate,
+    "local": render_resume_pdf_locally,
+}
+PDF_BACKEND_LABELS = {"google": "Google Docs", "local": "Local (offline)"}
+
+
+PDF_CACHE = process_singleton(
+    "pdf_cache",
+    lambda: DiskCache(
+        PDF_CACHE_CONFIG["directory"],
+        PDF_CACHE_CONFIG["max_mb"] * 2**20,
+        PDF_CACHE_CONFIG["ttl_seconds"],
+    ),
+)
+# (backend, template) -> (revision, checked_at)
+_TEMPLATE_REVISIONS = process_singleton("template_revisions", dict)
+
+
+def template_revision(backend, template):
+    """
+    Returns a value that changes whenever the template changes: the file
+    mtime for local templates, the Drive modifiedTime for Google Docs
+    (re-checked at most every revision_ttl_seconds). None if unknown.
+    """
+    if backend == "local":
+        return os.path.getmtime(template)
+    key = (backend, template)
+    with _PROCESS_STATE_LOCK:
+        known = _TEMPLATE_REVISIONS.get(key)
+    if known and time.time() - known[1] < PDF_CACHE_CONFIG["revision_ttl_seconds"]:
+        return known[0]
+    try:
+        drive_service = GOOGLE_CLIENTS.service("drive", "v3", GOOGLE_EXPORT_SCOPES)
+        revision = (
+            drive_service.files()
+            .get(fileId=template, fields="modifiedTime")
+            .execute()["modifiedTime"]
+        )
+    except Exception as e:
+        logger.warning(f"Could not read the revision of template {template}: {str(e)}")
+        return None
+    with _PROCESS_STATE_LOCK:
+        _TEMPLATE_REVISIONS[key] = (revision, time.time())
+    if known and known[0] != revision:
+        # Pooled copies were made from the previous revision
+        TEMPLATE_POOL.invalidate(template)
+    return revision
+
+
+def export_resume_pdf(
+    template,
+    placeholder_map,
+    font_family="Arial",
+    font_size=11,
+    bold=False,
+    backend=None,
+    bypass_cache=False,
+):
+    """
+    Exports the resume PDF with the chosen backend. template is the Google
+    Doc ID for "google" and an HTML template path for "local". Identical
+    exports against an unchanged template are served from PDF_CACHE.
+    """
+    backend = backend or PDF_EXPORT_CONFIG["backend"]
+    if backend == "local":
+        template = os.path.abspath(template or PDF_EXPORT_CONFIG["local_template"])
+    revision = template_revision(backend, template)
+    key = None
+    if revision is not None:
+        key = DiskCache.key(
+            "pdf",
+            backend,
+            template,
+            revision,
+            # The local renderer also fills in the portfolio's profile
+            PORTFOLIO_STORE.load().version if backend == "local" else None,
+            placeholder_map,
+            font_family,
+            font_size,
+            bool(bold),
         )
-    if requests:
-        docs_service.documents().batchUpdate(
-            documentId=duplicate_doc_id, body={"requests": requests}
-        ).execute()
-    # 3. Download as PDF
-    request = drive_service.files().export_media(
-        fileId=duplicate_doc_id, mimeType="application/pdf"
+        if not bypass_cache:
+            cached = PDF_CACHE.get(key)
+            if cached is not None:
+                return cached
+    pdf_bytes = PDF_BACKENDS[backend](
+        template, placeholder_map, font_family, font_size, bold
     )
-    fh = io.BytesIO()
-    downloader = MediaIoBaseDownload(fh, request)
-    done = False
-    while not done:
-        status, done = downloader.next_chunk()
-    fh.seek(0)
-    pdf_bytes = fh.read()
-    # 4. Delete the duplicate
-    drive_service.files().delete(fileId=duplicate_doc_id).execute()
+    if key is not None:
+        PDF_CACHE.set(key, pdf_bytes)
     return pdf_bytes
 
 
+# Startup-time report: per-module import cost of a cold `import app`
+def startup_report(budget_ms=None):
+    budget_ms = STARTUP_BUDGET_MS if budget_ms is None else budget_ms
+    module_dir = os.path.dirname(os.path.abspath(__file__))
+    module_name = os.path.splitext(os.path.basename(__file__))[0]
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module_name}"],
+        cwd=module_dir,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise Exception(f"Importing {module_name} failed: {result.stderr[-2000:]}")
+
+    # Lines look like "import time:  self [us] | cumulative | <indent>package";
+    # direct imports of the app module are indented one level below it
+    breakdown = {}
+    children = []
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|", 2)
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        name = name.strip()
+        if depth == 1:
+            children.append((name, int(cumulative)))
+        elif depth == 0:
+            if name == module_name:
+                total_us = int(cumulative)
+                for child, us in children:
+                    package = child.split(".")[0]
+                    breakdown[package] = breakdown.get(package, 0) + us
+            children = []
+
+    total_ms = total_us / 1000
+    return {
+        "total_ms": round(total_ms, 1),
+        "budget_ms": budget_ms,
+        "within_budget": total_ms <= budget_ms,
+        "modules": sorted(
+            ((name, round(us / 1000, 1)) for name, us in breakdown.items()),
+            key=lambda item: item[1],
+            reverse=True,
+        ),
+    }
+
+
+def cli(args):
+    parser = argparse.ArgumentParser(prog="app.py")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("startup-report", help="Per-module cold import cost")
+    batch = commands.add_parser(
+        "batch", help="Generate documents for a JSONL/CSV file of job descriptions"
+    )
+    batch.add_argument("input", help="JSONL or CSV with a job_description column")
+    batch.add_argument("output", help="JSONL results file, also used as checkpoint")
+    batch.add_argument("--provider", default=next(iter(MODEL_CONFIG)))
+    batch.add_argument("--document-type", default="Resume")
+    batch.add_argument("--concurrency", type=int, default=4)
+    batch.add_argument("--pdf-dir", help="Also export resume PDFs into this folder")
+    batch.add_argument(
+        "--template-doc-id",
+        help="Google Doc template ID, or HTML template path for the local backend",
+    )
+    batch.add_argument("--pdf-backend", choices=["google", "local"])
+    batch.add_argument("--bypass-cache", action="store_true")
+    batch.add_argument(
+        "--fake-google",
+        action="store_true",
+        help="Export PDFs against the in-memory Google Drive/Docs from fake_google",
+    )
+    batch.add_argument(
+        "--reuse-similar",
+        action="store_true",
+        help="Reuse the resume of a near-duplicate earlier posting",
+    )
+    loadtest = commands.add_parser(
+        "loadtest", help="End-to-end latency and throughput of generate_document"
+    )
+    loadtest.add_argument("--provider", default="openai")
+    loadtest.add_argument("--requests", type=int, default=50)
+    loadtest.add_argument("--concurrency", type=int, default=8)
+    loadtest.add_argument("--document-type", default="Resume")
+    loadtest.add_argument("--stream", action="store_true", help="Use stream_document")
+    loadtest.add_argument(
+        "--repeat",
+        action="store_true",
+        help="Send the same job description every time (response cache hits)",
+    )
+    loadtest.add_argument("--bypass-cache", action="store_true")
+    loadtest.add_argument(
+        "--job-description",
+        default="Backend engineer with Python, Django, PostgreSQL and AWS experience.",
+    )
+    loadtest.add_argument(
+        "--base-url", help="OpenAI-compatible endpoint to point the provider at"
+    )
+    loadtest.add_argument("--api-key", default="load-test")
+    loadtest.add_argument(
+        "--fake",
+        action="store_true",
+        help="Start fake_llm_server in-process and point the provider at it; "
+        "its options (see fake_llm_server.py --help) are accepted too",
+    )
+    loadtest.add_argument(
+        "--no-rate-limit", action="store_true", help="Skip the client-side rate limiter"
+    )
+    loadtest.add_argument(
+        "--ledger",
+        default=os.devnull,
+        help="Where to record the calls (default: nowhere, keeping cost reports clean)",
+    )
+    bench_local = commands.add_parser(
+        "bench-local", help="Compare local model tokens/sec across inference modes"
+    )
+    bench_local.add_argument("--modes", default="baseline,optimized")
+    bench_local.add_argument("--max-new-tokens", type=int, default=64)
+    bench_local.add_argument("--runs", type=int, default=3)
+    bench_local.add_argument(
+        "--job-description",
+        default="Backend engineer with Python, Django, PostgreSQL and AWS experience.",
+    )
+    finetune = commands.add_parser(
+        "finetune", help="Fine-tune the local model on personal_data.json"
+    )
+    finetune.add_argument("--output-dir", default=FINETUNE_CONFIG["output_dir"])
+    finetune.add_argument("--epochs", type=float, default=FINETUNE_CONFIG["epochs"])
+    finetune.add_argument("--block-size", type=int, default=FINETUNE_CONFIG["block_size"])
+    finetune.add_argument(
+        "--no-lora", action="store_true", help="Train all weights instead of adapters"
+    )
+    finetune.add_argument(
+        "--merge", action="store_true", help="Merge LoRA adapters into the saved model"
+    )
+    # fake_llm_server is only imported for loadtest --fake, which parses the
+    # server options itself
+    options, extra_args = parser.parse_known_args(args)
+    if extra_args and not (options.command == "loadtest" and options.fake):
+        parser.error(f"unrecognized arguments: {' '.join(extra_args)}")
+
+    if options.command == "startup-report":
+        report = startup_report()
+        for name, ms in report["modules"]:
+            print(f"{name:<30} {ms:>9.1f} ms")
+        print(f"{'total':<30} {report['total_ms']:>9.1f} ms (budget {report['budget_ms']} ms)")
+        return 0 if report["within_budget"] else 1
+    if options.command == "batch":
+        if options.fake_google:
+            import fake_google
+
+            fake_google.install(sys.modules[__name__])
+        summary = run_batch(
+            options.input,
+            options.output,
+            options.provider,
+            document_type=options.document_type,
+            concurrency=options.concurrency,
+            pdf_dir=options.pdf_dir,
+            template_doc_id=options.template_doc_id,
+            bypass_cache=options.bypass_cache,
+            pdf_backend=options.pdf_backend,
+            reuse_similar=options.reuse_similar,
+        )
+        print(json.dumps(summary, indent=2))
+        return 0 if summary["failures"] == 0 else 1
+    if options.command == "loadtest":
+        global LEDGER, RATE_LIMITER
+        base_url = options.base_url
+        server = None
+        if options.fake:
+            import fake_llm_server
+
+            fake_parser = argparse.ArgumentParser(prog="app.py loadtest --fake")
+            fake_llm_server.add_arguments(fake_parser)
+            server, base_url = fake_llm_server.start_server(
+                settings=fake_llm_server.settings_from_options(
+                    fake_parser.parse_args(extra_args)
+                )
+            )
+        if base_url:
+            MODEL_CONFIG[options.provider].update(
+                base_url=base_url,
+                api_key=options.api_key,
+                chat_endpoint="/chat/completions",
+            )
+        # Keep the traffic on the endpoint under test
+        ROUTER_CONFIG["cross_provider"] = False
+        LEDGER = Ledger(options.ledger)
+        if options.no_rate_limit:
+            RATE_LIMITER = RateLimiter({})
+        summary = run_load_test(
+            options.provider,
+            options.job_description,
+            requests=options.requests,
+            concurrency=options.concurrency,
+            document_type=options.document_type,
+            stream=options.stream,
+            unique=not options.repeat,
+            bypass_cache=options.bypass_cache,
+        )
+        if server:
+            summary["server"] = dict(server.RequestHandlerClass.settings.stats)
+            server.shutdown()
+        print(json.dumps(summary, indent=2))
+        return 0 if summary["failures"] == 0 else 1
+    if options.command == "finetune":
+        metrics = finetune_local_model(
+            output_dir=options.output_dir,
+            epochs=options.epochs,
+            block_size=options.block_size,
+            use_lora=not options.no_lora,
+            merge=options.merge,
+        )
+        print(json.dumps(metrics, indent=2))
+        return 0
+    if options.command == "bench-local":
+        if not os.path.exists(DATA_FILE):
+            save_personal_data()
+        results = benchmark_local_inference(
+            build_prompt(options.job_description, "Email"),
+            modes=options.modes.split(","),
+            max_new_tokens=options.max_new_tokens,
+            runs=options.runs,
+        )
+        for mode, result in results.items():
+            print(
+                f"{mode:<10} {result['tokens_per_second']:>8.2f} tok/s  "
+                f"load {result['load_seconds']:.2f}s  {result['memory_mb']:.0f} MB"
+            )
+        return 0
+    return 2
+
+
+IMPORT_TIMES[__name__] = time.perf_counter() - _STARTUP_BEGAN
+
 if __name__ == "__main__":
+    # `streamlit run app.py` passes no extra arguments
+    if len(sys.argv) > 1:
+        sys.exit(cli(sys.argv[1:]))
     main()
@@ -0,0 +1,284 @@
+"""Microbenchmarks for the non-LLM hot paths of app.py.
+
+Runs against a stub agent (no network, no model) in a scratch directory, and
+reports the median wall time and peak traced allocation per operation.
+Results are compared with bench_baselines.json:
+
+    python bench.py              # compare, exit 1 on a regression
+    python bench.py --update     # record new baselines
+    python bench.py -k parse     # only operations whose name contains "parse"
+
+Baselines are machine-specific; re-record them when changing hardware.
+"""
+
+import argparse
+import gc
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import app
+
+BASELINE_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "bench_baselines.json"
+)
+# An operation regresses when it is this much slower / allocates this much more
+TIME_THRESHOLD = 1.25
+MEMORY_THRESHOLD = 1.10
+
+JOB_DESCRIPTION = (
+    "Acme Payments is hiring a Senior Backend Engineer to build and scale the APIs "
+    "behind our merchant platform. You will design RESTful services in Python "
+    "(Django or Flask), model data in PostgreSQL and MongoDB, and deploy on AWS "
+    "(EC2, S3, Lambda) with Docker and CI/CD pipelines. Experience with React, "
+    "real-time systems, BLE or IoT integrations is a plus. You will mentor "
+    "engineers, own production reliability, and work with product and data "
+    "science on ML-driven features. 5+ years of experience required."
+)
+
+RESUME = {
+    "work_experience": [
+        {
+            "role": experience["role"],
+            "company": experience["company"],
+            "duration": experience["duration"],
+            "bullets": experience["description"][:7],
+        }
+        for experience in app.personal_data["experiences"]
+    ],
+    "projects": [
+        {
+            "name": project["name"],
+            "description": project["description"][:160] + ".",
+            "technologies": project["technologies"],
+        }
+        for project in app.personal_data["projects"][:4]
+    ],
+    "skills": {
+        "Languages": ["Python", "JavaScript", "TypeScript", "Java", "Kotlin", "Dart"],
+        "Frameworks": ["Django", "Flask", "React", "Next.js", "Flutter", "Express"],
+        "Cloud": ["AWS EC2", "S3", "Lambda", "CodePipeline", "Azure"],
+        "Data": ["PostgreSQL", "MongoDB", "Firebase", "Snowflake"],
+    },
+    "company_name": "Acme Payments",
+    "role_name": "Senior Backend Engineer",
+}
+RESUME_TEXT = json.dumps(RESUME, indent=2)
+# What models actually send back: fenced, with a trailing comma and cut short
+MALFORMED_RESUME_TEXT = (
+    "Here is your resume:\n```json\n"
+    + RESUME_TEXT.replace(
+        '"role_name": "Senior Backend Engineer"',
+        '"role_name": "Senior Backend Engineer",',
+    )
+)[: -len(RESUME_TEXT) // 5]
+# A list closed with the wrong bracket; the sections after it must still parse
+MISMATCHED_RESUME_TEXT = RESUME_TEXT.replace("]\n    },", "}\n    },", 1)
+
+
+class StubAgent:
+    """Just enough of LLMModel for generate_document: returns a canned resume."""
+
+    provider = "stub"
+    model_name = "stub"
+    is_local = False
+    prefix_cache_size = 0
+    temperature = 0.7
+    max_tokens = 1500
+
+    def run_sync(self, prompt, document_type=None, prefix=None):
+        return RESUME_TEXT
+
+
+class MemoryCache:
+    """In-memory stand-in for app.RESPONSE_CACHE."""
+
+    def __init__(self):
+        self._values = {}
+
+    def get(self, key):
+        return self._values.get(key)
+
+    def set(self, key, value):
+        self._values[key] = value
+
+
+def _editor_state():
+    # Roughly what the resume editor leaves in st.session_state
+    state = {
+        "selected_model": "openai",
+        "leased_model": "openai",
+        "generated_document": RESUME_TEXT,
+    }
+    for i in range(3):
+        for prefix in ("role_", "company_", "duration_", "bullets_"):
+            state[f"{prefix}{i}"] = "value"
+    for i in range(4):
+        for prefix in ("proj_name_", "proj_desc_", "proj_tech_"):
+            state[f"{prefix}{i}"] = "value"
+    for category in RESUME["skills"]:
+        state[f"skills_{category}"] = "value"
+    return state
+
+
+def operations():
+    agent = StubAgent()
+    work_experience, projects, skills = (
+        RESUME["work_experience"],
+        RESUME["projects"],
+        RESUME["skills"],
+    )
+    parse = app.parse_llm_json.__wrapped__  # bypass the lru_cache
+    editor_state = _editor_state()
+    resume = app.parse_resume(RESUME_TEXT)
+    return {
+        "build_prompt": lambda: app.build_prompt(JOB_DESCRIPTION, "Resume"),
+        "generate_document": lambda: app.generate_document(
+            JOB_DESCRIPTION, "Resume", agent, bypass_cache=True
+        ),
+        "parse_llm_json": lambda: parse(RESUME_TEXT),
+        "parse_llm_json_malformed": lambda: parse(MALFORMED_RESUME_TEXT),
+        "parse_llm_json_mismatched": lambda: parse(MISMATCHED_RESUME_TEXT),
+        "build_placeholder_map": lambda: app.build_placeholder_map(
+            work_experience, projects, skills
+        ),
+        # What every resume editor rerun pays for the parsed resume
+        "parse_resume_cached": lambda: app.parse_resume(RESUME_TEXT),
+        "resume_edited_sections": lambda: resume.edited_sections(editor_state),
+        "prepare_dataset": app.prepare_dataset,
+        "reset_resume_editor_state": lambda: app.reset_resume_editor_state(
+            dict(editor_state)
+        ),
+    }
+
+
+def measure(fn, min_seconds=0.2, repeats=5):
+    fn()  # warm caches (portfolio snapshot, lazy imports)
+    # Size the inner loop so one repeat takes about min_seconds / repeats
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds / repeats:
+            break
+        loops *= 2
+    timings = [elapsed / loops]
+    gc.disable()
+    try:
+        for _ in range(repeats - 1):
+            started = time.perf_counter()
+            for _ in range(loops):
+                fn()
+            timings.append((time.perf_counter() - started) / loops)
+    finally:
+        gc.enable()
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {
+        "median_us": round(statistics.median(timings) * 1e6, 1),
+        "peak_kb": round((peak - before) / 1024, 1),
+        "loops": loops,
+    }
+
+
+def compare(results, baselines, time_threshold, memory_threshold):
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if not baseline:
+            continue
+        if result["median_us"] > baseline["median_us"] * time_threshold:
+            regressions.append(
+                f"{name}: {result['median_us']}us vs baseline {baseline['median_us']}us"
+            )
+        # Allocations below a few KB are noise
+        if result["peak_kb"] > max(4.0, baseline["peak_kb"] * memory_threshold):
+            regressions.append(
+                f"{name}: {result['peak_kb']}KB vs baseline {baseline['peak_kb']}KB"
+            )
+    return regressions
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog="bench.py")
+    parser.add_argument("-k", dest="filter", help="Only run operations containing this")
+    parser.add_argument(
+        "--update", action="store_true", help="Write results as the new baselines"
+    )
+    parser.add_argument("--time-threshold", type=float, default=TIME_THRESHOLD)
+    parser.add_argument("--memory-threshold", type=float, default=MEMORY_THRESHOLD)
+    options = parser.parse_args(args)
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    baselines = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as f:
+            baselines = json.load(f)
+
+    results = {}
+    original_cache = app.RESPONSE_CACHE
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        # personal_data.json lives in the scratch dir; responses are cached in
+        # memory so disk latency does not drown out prompt assembly
+        os.chdir(scratch)
+        app.RESPONSE_CACHE = MemoryCache()
+        try:
+            app.save_personal_data()
+            for name, fn in operations().items():
+                if options.filter and options.filter not in name:
+                    continue
+                try:
+                    results[name] = measure(fn)
+                except ImportError as e:
+                    print(f"{name:<28} skipped ({e})")
+                    continue
+                baseline = baselines.get(name, {})
+                change = ""
+                if baseline:
+                    change = (
+                        f"{results[name]['median_us'] / baseline['median_us']:>6.2f}x"
+                    )
+                print(
+                    f"{name:<28} {results[name]['median_us']:>12.1f} us "
+                    f"{results[name]['peak_kb']:>10.1f} KB {change}"
+                )
+        finally:
+            app.RESPONSE_CACHE = original_cache
+            os.chdir(cwd)
+
+    if options.update:
+        baselines.update(
+            {
+                name: {k: r[k] for k in ("median_us", "peak_kb")}
+                for name, r in results.items()
+            }
+        )
+        with open(BASELINE_FILE, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baselines written to {BASELINE_FILE}")
+        return 0
+    regressions = compare(
+        results, baselines, options.time_threshold, options.memory_threshold
+    )
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
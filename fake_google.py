@@ -0,0 +1,322 @@
+"""In-memory stand-in for the Google Drive v3 and Docs v1 services.
+
+Mirrors the chained ``service.files().copy(...).execute()`` style of
+googleapiclient for the handful of calls app.py makes, so PDF export and the
+template pool can run offline. It is injected from outside the app, with
+``install(app)`` or ``python app.py batch --fake-google``, and
+
+    python fake_google.py
+
+exports a resume through the Google backend against a template that uses the
+app's placeholder names, checking that every placeholder gets replaced.
+"""
+
+import argparse
+import itertools
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import httplib2
+
+# The {{NAME}} placeholders app.build_placeholder_map fills in
+TEMPLATE_PLACEHOLDERS = ["SKILLS", "PROJECTS"] + [
+    f"{field}{i}"
+    for i in range(1, 4)
+    for field in ("ROLE", "COMPANY", "DURATION", "EXPERIENCE")
+]
+TEMPLATE_TEXT = "\n".join(
+    [
+        f"{{{{ROLE{i}}}}} at {{{{COMPANY{i}}}}} ({{{{DURATION{i}}}}})\n{{{{EXPERIENCE{i}}}}}"
+        for i in range(1, 4)
+    ]
+    + ["Projects\n{{PROJECTS}}", "Skills\n{{SKILLS}}"]
+)
+
+
+class FakeHttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(f"{status} {message}")
+        # Same attribute googleapiclient.errors.HttpError exposes
+        self.status_code = status
+
+
+def _rfc3339(timestamp):
+    return (
+        datetime.fromtimestamp(timestamp, timezone.utc)
+        .isoformat(timespec="milliseconds")
+        .replace("+00:00", "Z")
+    )
+
+
+class FakeGoogleBackend:
+    """Shared file store behind the fake Drive and Docs services."""
+
+    def __init__(self, latency_seconds=0.0, template_text=None):
+        self.latency_seconds = latency_seconds
+        # When set, unknown ids passed to copy/get are treated as templates
+        # with this text, so any template id works offline
+        self.template_text = template_text
+        self.files = {}
+        self.calls = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def add_template(self, text, name="Template", file_id=None):
+        with self._lock:
+            file_id = file_id or f"fake-doc-{next(self._ids)}"
+            now = time.time()
+            self.files[file_id] = {
+                "id": file_id,
+                "name": name,
+                "text": text,
+                "createdTime": now,
+                "modifiedTime": now,
+            }
+        return file_id
+
+    def _call(self, name, file_id=None):
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        with self._lock:
+            self.calls.append((name, file_id))
+            missing = file_id is not None and file_id not in self.files
+        if missing:
+            if self.template_text is None or name not in ("copy", "get"):
+                raise FakeHttpError(404, f"File not found: {file_id}")
+            self.add_template(self.template_text, file_id=file_id)
+        with self._lock:
+            return self.files.get(file_id)
+
+
+class _Request:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def execute(self, num_retries=0):
+        return self._fn()
+
+
+class _MediaRequest:
+    """Quacks like googleapiclient.http.HttpRequest for MediaIoBaseDownload."""
+
+    def __init__(self, backend, file_id, mime_type):
+        self.uri = f"fake://export/{file_id}?mimeType={mime_type}"
+        self.headers = {}
+        self.http = _MediaHttp(backend, file_id)
+
+    def execute(self, num_retries=0):
+        return self.http.request(self.uri)[1]
+
+
+class _MediaHttp:
+    def __init__(self, backend, file_id):
+        self._backend = backend
+        self._file_id = file_id
+
+    def request(self, uri, method="GET", headers=None, **kwargs):
+        try:
+            entry = self._backend._call("export", self._file_id)
+        except FakeHttpError as e:
+            return httplib2.Response({"status": e.status_code}), b""
+        content = b"%PDF-1.4\n% fake export\n" + entry["text"].encode("utf-8")
+        return (
+            httplib2.Response({"status": 200, "content-length": str(len(content))}),
+            content,
+        )
+
+
+class _Files:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def copy(self, fileId, body=None, **kwargs):
+        def run():
+            source = self._backend._call("copy", fileId)
+            name = (body or {}).get("name") or f"Copy of {source['name']}"
+            return {"id": self._backend.add_template(source["text"], name=name)}
+
+        return _Request(run)
+
+    def get(self, fileId, fields=None, **kwargs):
+        def run():
+            entry = self._backend._call("get", fileId)
+            return {
+                "id": entry["id"],
+                "name": entry["name"],
+                "modifiedTime": _rfc3339(entry["modifiedTime"]),
+            }
+
+        return _Request(run)
+
+    def delete(self, fileId, **kwargs):
+        def run():
+            self._backend._call("delete", fileId)
+            with self._backend._lock:
+                self._backend.files.pop(fileId, None)
+            return ""
+
+        return _Request(run)
+
+    def list(self, q="", fields=None, pageSize=100, pageToken=None, **kwargs):
+        # Supports the `name contains '<prefix>'` clause used by the pool sweeper;
+        # every fake file is owned by the caller, so `'me' in owners` always holds
+        prefix = ""
+        if "name contains '" in q:
+            prefix = q.split("name contains '", 1)[1].split("'", 1)[0]
+
+        def run():
+            self._backend._call("list")
+            with self._backend._lock:
+                matches = sorted(
+                    (f for f in self._backend.files.values() if prefix in f["name"]),
+                    key=lambda f: f["id"],
+                )
+            start = int(pageToken or 0)
+            page = matches[start : start + pageSize]
+            result = {
+                "files": [
+                    {"id": f["id"], "name": f["name"], "createdTime": _rfc3339(f["createdTime"])}
+                    for f in page
+                ]
+            }
+            if start + pageSize < len(matches):
+                result["nextPageToken"] = str(start + pageSize)
+            return result
+
+        return _Request(run)
+
+    def export_media(self, fileId, mimeType):
+        return _MediaRequest(self._backend, fileId, mimeType)
+
+
+class FakeDriveService:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def files(self):
+        return _Files(self._backend)
+
+
+class _Documents:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def batchUpdate(self, documentId, body):
+        def run():
+            entry = self._backend._call("batchUpdate", documentId)
+            with self._backend._lock:
+                text = entry["text"]
+                for request in body.get("requests", []):
+                    replace = request.get("replaceAllText")
+                    if replace:
+                        text = text.replace(
+                            replace["containsText"]["text"], replace["replaceText"]
+                        )
+                entry["text"] = text
+                entry["modifiedTime"] = time.time()
+            return {"documentId": documentId, "replies": []}
+
+        return _Request(run)
+
+
+class FakeDocsService:
+    def __init__(self, backend):
+        self._backend = backend
+
+    def documents(self):
+        return _Documents(self._backend)
+
+
+def build(name, backend):
+    """Returns the fake service for a googleapiclient service name."""
+    if name == "drive":
+        return FakeDriveService(backend)
+    if name == "docs":
+        return FakeDocsService(backend)
+    raise ValueError(f"No fake for Google service {name!r}")
+
+
+class FakeGoogleClients:
+    """Stands in for app.GoogleClients: same service() call, no credentials."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def service(self, name, version, scopes):
+        return build(name, self.backend)
+
+
+def install(app, backend=None):
+    """Points app's Google exports at backend (a fresh one by default)."""
+    backend = backend or FakeGoogleBackend(template_text=TEMPLATE_TEXT)
+    app.GOOGLE_CLIENTS = FakeGoogleClients(backend)
+    return backend
+
+
+def check_export(latency_seconds=0.0):
+    """
+    Exports a resume through app's Google backend and returns the problems
+    found: placeholders the app no longer emits, or left unreplaced.
+    """
+    import app
+
+    backend = install(app, FakeGoogleBackend(latency_seconds=latency_seconds))
+    template_id = backend.add_template(TEMPLATE_TEXT, name="Resume template")
+    # Copies pooled against an earlier backend do not exist in this one
+    app.TEMPLATE_POOL.invalidate(template_id)
+    work_experience = [
+        {
+            "role": f"Role {i}",
+            "company": f"Company {i}",
+            "duration": f"20{10 + i} - 20{11 + i}",
+            "bullets": [f"Bullet {i}a", f"Bullet {i}b"],
+        }
+        for i in range(1, 4)
+    ]
+    projects = [{"name": "Project", "description": "Does things.", "technologies": ["Go"]}]
+    placeholder_map = app.build_placeholder_map(
+        work_experience, projects, {"Languages": ["Python"]}
+    )
+    problems = [
+        f"template has {{{{{name}}}}} but the app does not fill it"
+        for name in TEMPLATE_PLACEHOLDERS
+        if name not in placeholder_map
+    ]
+    pdf = app.export_resume_pdf(
+        template_id, placeholder_map, backend="google", bypass_cache=True
+    ).decode("utf-8", "replace")
+    app.TEMPLATE_POOL.wait_for_deletions()
+    problems += [
+        f"{{{{{name}}}}} was not replaced"
+        for name in TEMPLATE_PLACEHOLDERS
+        if f"{{{{{name}}}}}" in pdf
+    ]
+    problems += [
+        f"{name} value {placeholder_map[name]!r} missing from the export"
+        for name in TEMPLATE_PLACEHOLDERS
+        if name in placeholder_map and placeholder_map[name] not in pdf
+    ]
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="fake_google.py")
+    parser.add_argument("--latency", type=float, default=0.0)
+    options = parser.parse_args()
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch:
+        # Caches and personal_data.json stay out of the working directory
+        os.chdir(scratch)
+        try:
+            problems = check_export(options.latency)
+        finally:
+            os.chdir(cwd)
+    for problem in problems:
+        print(f"FAIL {problem}")
+    print("Placeholder replacement OK" if not problems else f"{len(problems)} problems")
+    sys.exit(1 if problems else 0)
@@ -0,0 +1,358 @@
+"""OpenAI-compatible stand-in for /chat/completions, for offline load tests.
+
+Speaks the request/response schema LLMModel uses (including SSE streaming
+with a final usage chunk), answers resume prompts with canned resume JSON,
+and can inject latency and 404/429/5xx errors:
+
+    python fake_llm_server.py --port 8800 --latency lognormal:0.8,0.5 \\
+        --rate-429 0.05 --rate-5xx 0.02 --missing-models grok-3
+
+Point a provider at it with base_url http://127.0.0.1:8800/v1 and any API key.
+"""
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_RESUME = {
+    "work_experience": [
+        {
+            "role": "Full Stack Developer",
+            "company": "Epitome Research And Innovation Inc, Herndon, VA",
+            "duration": "Sep 2024 – Present",
+            "bullets": [
+                "Built RESTful APIs with Flask and Django serving 50+ clients, cutting development cycles from 20 to 15 weeks.",
+                "Reduced MongoDB query latency from 200 ms to 130 ms with a redesigned storage layout.",
+                "Set up CI/CD with AWS CodeBuild and CodePipeline, reducing build times from 20 to 12 minutes.",
+                "Automated EC2, EFS and Elastic IP management with Boto3.",
+            ],
+        },
+        {
+            "role": "Associate Developer Intern (Boomi Integration Architect)",
+            "company": "Quotient Technologies Inc., Bengaluru, India",
+            "duration": "Dec 2021 – June 2022",
+            "bullets": [
+                "Synchronized Salesforce and NetSuite data with Dell Boomi at a 100% success rate.",
+                "Automated data pipelines with Apache Airflow, from 5 hours to 1 hour of weekly manual work.",
+                "Built Okta off-boarding flows that cut processing from 10 minutes to 1 minute.",
+                "Optimized Snowflake transformations for better storage efficiency.",
+            ],
+        },
+        {
+            "role": "Founder & Lead Software Developer",
+            "company": "Confegure Techsols Pvt Ltd, Hyderabad, India",
+            "duration": "May 2020 – May 2024",
+            "bullets": [
+                "Led projects from conception to launch with Agile, mentoring a team of 10+.",
+                "Designed Node.js and Spring Boot backends, reducing API response times from 500 ms to 300 ms.",
+                "Published mobile apps with 20,000+ downloads using Flutter and Kotlin.",
+                "Built an ESP32 IoT module with MQTT for smart home automation.",
+            ],
+        },
+    ],
+    "projects": [
+        {
+            "name": "Lock Down Mart",
+            "description": "E-commerce platform with virtual queues for local grocery stores during lockdown.",
+            "technologies": ["Flutter", "Firebase", "Google Maps API", "NodeJS"],
+        },
+        {
+            "name": "Cinemawala",
+            "description": "Cross-platform film production management with role-based permissions.",
+            "technologies": ["Flutter", "NodeJS", "MongoDB", "Firebase"],
+        },
+        {
+            "name": "Udhyogulu",
+            "description": "Location-aware news app with topic subscriptions and real-time alerts.",
+            "technologies": ["React", "Redux", "PHP", "AWS S3"],
+        },
+    ],
+    "skills": {
+        "Languages": ["Python", "JavaScript", "TypeScript", "Java", "Kotlin", "Dart"],
+        "Frameworks": ["Django", "Flask", "React", "Next.js", "Flutter", "Express"],
+        "Cloud & DevOps": ["AWS", "Azure", "Docker", "CI/CD"],
+        "Databases": ["PostgreSQL", "MongoDB", "Firebase", "Snowflake"],
+    },
+    "company_name": "Acme",
+    "role_name": "Software Engineer",
+}
+
+CANNED_ANALYSIS = {
+    "company_name": "Acme",
+    "role_name": "Software Engineer",
+    "required_skills": ["Python", "Django", "AWS", "PostgreSQL"],
+    "nice_to_have_skills": ["React", "Docker"],
+    "responsibilities": ["Build and scale backend APIs", "Own production reliability"],
+}
+
+CANNED_LETTER = (
+    "Dear Hiring Manager,\n\nI am excited to apply for the Software Engineer role at "
+    "Acme. Over four years I have shipped web, mobile and IoT products end to end, "
+    "from Django and Flask APIs on AWS to Flutter apps with 50,000+ downloads.\n\n"
+    "As the co-founder of a startup I ran for four years while completing my degrees, "
+    "I bring ownership and leadership along with the technical depth. Where your stack "
+    "differs from mine, I learn fast.\n\nBest regards,\nSumanth Bejugam"
+)
+
+
+class LatencyModel:
+    """Parses "fixed:S", "uniform:A,B", "normal:MEAN,SD" or "lognormal:MEDIAN,SIGMA"."""
+
+    def __init__(self, spec, rng):
+        kind, _, args = spec.partition(":")
+        self.kind = kind
+        self.args = [float(a) for a in args.split(",") if a]
+        self.rng = rng
+        if kind not in ("fixed", "uniform", "normal", "lognormal"):
+            raise ValueError(f"Unknown latency distribution {spec!r}")
+
+    def sample(self):
+        if self.kind == "fixed":
+            return self.args[0]
+        if self.kind == "uniform":
+            return self.rng.uniform(*self.args)
+        if self.kind == "normal":
+            return max(0.0, self.rng.gauss(*self.args))
+        median, sigma = self.args
+        return self.rng.lognormvariate(math.log(median), sigma)
+
+
+class FakeLLMSettings:
+    def __init__(
+        self,
+        latency="fixed:0.2",
+        ttft="fixed:0.1",
+        tokens_per_second=200.0,
+        rate_404=0.0,
+        rate_429=0.0,
+        rate_5xx=0.0,
+        retry_after=1,
+        missing_models=(),
+        seed=None,
+    ):
+        self.rng = random.Random(seed)
+        self.latency = LatencyModel(latency, self.rng)
+        self.ttft = LatencyModel(ttft, self.rng)
+        self.tokens_per_second = tokens_per_second
+        self.rate_404 = rate_404
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.retry_after = retry_after
+        self.missing_models = set(missing_models)
+        self.stats = {"requests": 0, "404": 0, "429": 0, "5xx": 0, "ok": 0}
+        self.lock = threading.Lock()
+
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def roll(self):
+        """Picks the injected error (or None) for one request."""
+        with self.lock:
+            value = self.rng.random()
+        for status, rate in ((404, self.rate_404), (429, self.rate_429), (503, self.rate_5xx)):
+            if value < rate:
+                return status
+            value -= rate
+        return None
+
+
+def canned_completion(prompt):
+    if "tailored resume" in prompt or "These resume sections" in prompt:
+        return json.dumps(CANNED_RESUME, indent=2, ensure_ascii=False)
+    if "Extract the facts" in prompt:
+        return json.dumps(CANNED_ANALYSIS, indent=2)
+    return CANNED_LETTER
+
+
+def _split_tokens(text):
+    # Word-ish pieces, each keeping its leading whitespace, like model tokens
+    pieces, current = [], ""
+    for ch in text:
+        if ch.isspace() and current.strip():
+            pieces.append(current)
+            current = ""
+        current += ch
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so client pooling is exercised
+    settings = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("health"):
+            with self.settings.lock:
+                stats = dict(self.settings.stats)
+            return self._send_json(200, {"status": "ok", "stats": stats})
+        self._send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        settings = self.settings
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        settings.count("requests")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            settings.count("404")
+            return self._send_json(404, {"error": {"message": f"No route {self.path}"}})
+        model = request.get("model", "fake-model")
+        injected = settings.roll()
+        if model in settings.missing_models:
+            injected = 404
+        if injected == 404:
+            settings.count("404")
+            return self._send_json(
+                404, {"error": {"message": f"The model {model} does not exist"}}
+            )
+        if injected == 429:
+            settings.count("429")
+            return self._send_json(
+                429,
+                {"error": {"message": "Rate limit reached", "type": "rate_limit"}},
+                {"Retry-After": str(settings.retry_after)},
+            )
+        if injected == 503:
+            settings.count("5xx")
+            return self._send_json(503, {"error": {"message": "Service unavailable"}})
+
+        prompt = " ".join(m.get("content", "") for m in request.get("messages", []))
+        completion = canned_completion(prompt)
+        usage = {
+            "prompt_tokens": max(1, len(prompt) // 4),
+            "completion_tokens": max(1, len(completion) // 4),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        settings.count("ok")
+
+        if not request.get("stream"):
+            time.sleep(settings.latency.sample())
+            return self._send_json(
+                200,
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": completion},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": usage,
+                },
+            )
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(settings.ttft.sample())
+        delay = 1.0 / settings.tokens_per_second if settings.tokens_per_second else 0
+        try:
+            for piece in _split_tokens(completion):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": piece}}],
+                }
+                self._send_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+                if delay:
+                    time.sleep(delay)
+            if (request.get("stream_options") or {}).get("include_usage"):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [],
+                    "usage": usage,
+                }
+                self._send_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+            self._send_chunk(b"data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client closed the stream early (cancelled race, stop button)
+            self.close_connection = True
+
+
+def start_server(host="127.0.0.1", port=0, settings=None):
+    """Serves in a daemon thread; returns (server, base_url)."""
+    handler = type(
+        "ConfiguredFakeLLMHandler",
+        (FakeLLMHandler,),
+        {"settings": settings or FakeLLMSettings()},
+    )
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fake-llm", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def add_arguments(parser):
+    parser.add_argument("--latency", default="fixed:0.2", help="Non-streaming response time")
+    parser.add_argument("--ttft", default="fixed:0.1", help="Streaming time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--rate-404", type=float, default=0.0)
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-5xx", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--missing-models", default="", help="Comma separated models that 404")
+    parser.add_argument("--seed", type=int)
+
+
+def settings_from_options(options):
+    return FakeLLMSettings(
+        latency=options.latency,
+        ttft=options.ttft,
+        tokens_per_second=options.tokens_per_second,
+        rate_404=options.rate_404,
+        rate_429=options.rate_429,
+        rate_5xx=options.rate_5xx,
+        retry_after=options.retry_after,
+        missing_models=[m for m in options.missing_models.split(",") if m],
+        seed=options.seed,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog="fake_llm_server.py")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    add_arguments(parser)
+    options = parser.parse_args()
+    server, base_url = start_server(options.host, options.port, settings_from_options(options))
+    print(f"Fake chat completions at {base_url}/chat/completions")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()